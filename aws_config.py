@@ -24,3 +24,7 @@ dynamodb = boto3.resource(
 
 # DynamoDB Users Table
 users_table = dynamodb.Table('Users')
+
+# DynamoDB UserObjects Table: the objects charged to each user's quota
+# (partition key username, sort key object_key = "<bucket>#<key>")
+user_objects_table = dynamodb.Table('UserObjects')
@@ -6,6 +6,18 @@ import threading
 import queue
 import boto3
 from datetime import datetime
+from utils.transfer_config import get_transfer_profile, client_config
+from utils.file_hash import HashCache
+from utils.listing_cache import ListingCache
+from utils.usage_accountant import UsageAccountant
+from utils.dynamodb_helper import charge_object, release_objects, move_charges, move_prefix_charges
+from utils.sync_engine import SyncEngine, SYNC_PULL
+from utils.ranged_download import RangedDownloader
+from utils.transfer_pool import TransferPool, TransferJob, format_duration
+from utils.background import BackgroundExecutor
+from utils.virtual_tree import VirtualTreeview, ProgressiveLoader
+from utils.bulk_delete import BulkDeleter
+from utils.folder_move import FolderMover, MoveJournal, MoveCancelled, MOVE_DELETING
 
 class ModernTheme:
     def __init__(self, root):
@@ -107,8 +119,22 @@ class ModernTheme:
         )
 
 class S3Helper:
-    def __init__(self):
-        self.s3_client = boto3.client('s3')
+    def __init__(self, transfer_profile=None, pool_workers=8, quota_user=None):
+        # transfer_profile is a name from TRANSFER_PROFILES, or None/'auto' to pick by file size
+        self.transfer_profile = transfer_profile
+        self.pool_workers = pool_workers
+        self.s3_client = boto3.client(
+            's3',
+            config=client_config(transfer_profile, pool_workers)
+        )
+        # Folder listings shown in the tree; our own changes invalidate them
+        self.listing_cache = ListingCache()
+        # Storage totals per bucket and prefix, adjusted by our own changes
+        self.usage = UsageAccountant()
+        # Planned and finished steps of folder moves, to recover from interrupted ones
+        self.move_journal = MoveJournal()
+        # User whose DynamoDB storage counter and charged objects our copies, moves and deletes update
+        self.quota_user = quota_user
 
     def list_buckets(self):
         try:
@@ -118,51 +144,219 @@ class S3Helper:
             raise Exception(f"Failed to list buckets: {str(e)}")
     
     def list_bucket_contents(self, bucket_name, prefix=''):
+        """Yield the objects under prefix one listing page (up to 1000) at a time"""
+        try:
+            paginator = self.s3_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+                yield page.get('Contents', [])
+        except Exception as e:
+            raise Exception(f"Failed to list bucket contents: {str(e)}")
+
+    def list_folder(self, bucket_name, prefix=''):
+        """Yield (folder prefixes, objects) pages for the direct children of prefix"""
+        cached = self.listing_cache.get(bucket_name, prefix)
+        if cached is not None:
+            yield from cached
+            return
+
+        pages = []
+        try:
+            paginator = self.s3_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, Delimiter='/'):
+                folders = [common['Prefix'] for common in page.get('CommonPrefixes', [])]
+                pages.append((folders, page.get('Contents', [])))
+                yield pages[-1]
+        except Exception as e:
+            raise Exception(f"Failed to list folder: {str(e)}")
+        # Only complete listings are cached
+        self.listing_cache.put(bucket_name, prefix, pages)
+
+    def iter_objects(self, bucket_name, prefix=''):
+        """Yield every object under prefix, one listing page at a time"""
+        for page in self.list_bucket_contents(bucket_name, prefix):
+            yield from page
+
+    def delete_objects(self, bucket_name, objects):
+        """Delete up to 1000 listed objects (dicts with Key and Size) in one request"""
+        if not objects:
+            return
         try:
-            response = self.s3_client.list_objects_v2(
+            response = self.s3_client.delete_objects(
                 Bucket=bucket_name,
-                Prefix=prefix
+                Delete={'Objects': [{'Key': obj['Key']} for obj in objects], 'Quiet': True}
             )
-            return response.get('Contents', [])
         except Exception as e:
-            raise Exception(f"Failed to list bucket contents: {str(e)}")
-        
-    def upload_file(self, file_obj, s3_path, bucket_name, callback=None):
+            raise Exception(f"Failed to delete objects: {str(e)}")
+        errors = response.get('Errors', [])
+        failed = {error.get('Key') for error in errors}
+        self.objects_deleted(bucket_name, [obj for obj in objects if obj['Key'] not in failed])
+        if errors:
+            raise Exception(f"Failed to delete {len(errors)} object(s), first: {errors[0].get('Key')}")
+
+    def delete_prefix(self, bucket_name, prefix, callback=None):
+        """Delete every object under prefix in concurrent 1000-key batches; returns the number deleted
+
+        ``callback(deleted, failed)`` receives running totals as batches finish.
+        """
+        deleter = BulkDeleter(self.s3_client, max_concurrency=self.pool_workers, on_deleted=self.objects_deleted)
         try:
-            if callback:
-                # Create a wrapper for the callback that doesn't use Tkinter
-                def progress_wrapper(bytes_amount):
-                    try:
-                        if callback:
-                            callback(bytes_amount)
-                    except Exception:
-                        pass  # Suppress any callback errors
-                
-                self.s3_client.upload_fileobj(
-                    file_obj,
-                    bucket_name,
-                    s3_path,
-                    Callback=progress_wrapper
-                )
-            else:
-                self.s3_client.upload_fileobj(
-                    file_obj,
-                    bucket_name,
-                    s3_path
-                )
+            deleted, errors = deleter.delete(bucket_name, self.iter_objects(bucket_name, prefix), callback)
+        finally:
+            self.listing_cache.invalidate_tree(bucket_name, prefix)
+        if errors:
+            raise Exception(f"Failed to delete {len(errors)} object(s), first: {errors[0].get('Key')} ({errors[0].get('Code')})")
+        return deleted
+
+    def delete_object(self, bucket_name, key, size=None):
+        """Delete one key; size is looked up first when usage is tracked and it is not given"""
+        if size is None:
+            size = self.object_size(bucket_name, key) if self.usage.is_tracking(bucket_name) else 0
+        try:
+            self.s3_client.delete_object(Bucket=bucket_name, Key=key)
         except Exception as e:
-            raise Exception(f"Failed to upload file: {str(e)}")    
-    
+            raise Exception(f"Failed to delete object: {str(e)}")
+        self.objects_deleted(bucket_name, [{'Key': key, 'Size': size}])
+
+    def objects_deleted(self, bucket_name, objects):
+        """Update the listing cache, usage totals and quota for deleted objects"""
+        self.listing_cache.invalidate_keys(bucket_name, [obj['Key'] for obj in objects])
+        for obj in objects:
+            self.usage.adjust(bucket_name, obj['Key'], -obj.get('Size', 0))
+        if self.quota_user:
+            # Only objects this user was charged for give bytes back
+            release_objects(self.quota_user, bucket_name, [obj['Key'] for obj in objects])
+
+    def folder_mover(self):
+        return FolderMover(
+            self.s3_client,
+            max_concurrency=self.pool_workers,
+            journal=self.move_journal,
+            on_copied=lambda bucket, objects: self.objects_moved(bucket, objects, 1),
+            on_deleted=lambda bucket, objects: self.objects_moved(bucket, objects, -1)
+        )
+
+    def move_prefix(self, bucket_name, source_prefix, target_prefix, callback=None, cancel_event=None):
+        """Move a folder server-side (see FolderMover); returns the number of objects moved"""
+        try:
+            moved = self.folder_mover().move(
+                bucket_name,
+                self.iter_objects(bucket_name, source_prefix),
+                source_prefix,
+                target_prefix,
+                callback,
+                cancel_event
+            )
+            if self.quota_user:
+                move_prefix_charges(self.quota_user, bucket_name, source_prefix, target_prefix)
+            return moved
+        finally:
+            self.listing_cache.invalidate_tree(bucket_name, source_prefix)
+            self.listing_cache.invalidate_tree(bucket_name, target_prefix)
+
+    def resume_move(self, move, callback=None):
+        """Finish a journaled move that was interrupted"""
+        try:
+            moved = self.folder_mover().resume(move, callback)
+            if self.quota_user:
+                move_prefix_charges(self.quota_user, move['bucket'], move['source_prefix'], move['target_prefix'])
+            return moved
+        finally:
+            self.listing_cache.invalidate_tree(move['bucket'], move['source_prefix'])
+            self.listing_cache.invalidate_tree(move['bucket'], move['target_prefix'])
+
+    def roll_back_move(self, move, callback=None):
+        """Undo a journaled move that was interrupted"""
+        try:
+            return self.folder_mover().roll_back(move, callback)
+        finally:
+            self.listing_cache.invalidate_tree(move['bucket'], move['source_prefix'])
+            self.listing_cache.invalidate_tree(move['bucket'], move['target_prefix'])
+
+    def objects_moved(self, bucket_name, objects, sign):
+        """Update the listing cache and usage totals for one side of a move; quota is unchanged by a move"""
+        self.listing_cache.invalidate_keys(bucket_name, [obj['Key'] for obj in objects])
+        for obj in objects:
+            size = obj.get('Size', 0) if sign > 0 else None
+            self.usage.adjust(bucket_name, obj['Key'], sign * obj.get('Size', 0), size)
+
+    def copy_object(self, bucket_name, source_key, target_key, size=None):
+        if size is None:
+            tracked = self.quota_user or self.usage.is_tracking(bucket_name)
+            size = self.object_size(bucket_name, source_key) if tracked else 0
+        replaced = self.replaced_size(bucket_name, target_key)
+        try:
+            self.s3_client.copy_object(
+                CopySource={'Bucket': bucket_name, 'Key': source_key},
+                Bucket=bucket_name,
+                Key=target_key
+            )
+        except Exception as e:
+            raise Exception(f"Failed to copy object: {str(e)}")
+        finally:
+            self.listing_cache.invalidate(bucket_name, target_key)
+        self.usage.adjust(bucket_name, target_key, size - replaced, size)
+        if self.quota_user:
+            # Replacing one of our own objects only charges the difference
+            charge_object(self.quota_user, bucket_name, target_key, size)
+
+    def move_object(self, bucket_name, source_key, target_key):
+        """Move one object (copy, then delete); its quota charge, if it is the user's, moves with it"""
+        size = self.object_size(bucket_name, source_key)
+        try:
+            self.s3_client.copy_object(
+                CopySource={'Bucket': bucket_name, 'Key': source_key},
+                Bucket=bucket_name,
+                Key=target_key
+            )
+        except Exception as e:
+            raise Exception(f"Failed to copy object: {str(e)}")
+        finally:
+            self.listing_cache.invalidate(bucket_name, target_key)
+        self.objects_moved(bucket_name, [{'Key': target_key, 'Size': size}], 1)
+
+        try:
+            self.s3_client.delete_object(Bucket=bucket_name, Key=source_key)
+        except Exception as e:
+            raise Exception(f"Failed to delete object: {str(e)}")
+        self.objects_moved(bucket_name, [{'Key': source_key, 'Size': size}], -1)
+        if self.quota_user:
+            # One of the user's objects that the move overwrote is no longer stored
+            move_charges(self.quota_user, bucket_name, [(source_key, target_key)])
+
+    def object_size(self, bucket_name, key):
+        try:
+            return self.s3_client.head_object(Bucket=bucket_name, Key=key)['ContentLength']
+        except Exception:
+            return 0
+
+    def replaced_size(self, bucket_name, key):
+        """Size of the object a write to key is about to replace, when the bucket's usage is tracked"""
+        return self.object_size(bucket_name, key) if self.usage.is_tracking(bucket_name) else 0
+
+    def transfer_config(self, file_size=None):
+        """boto3 TransferConfig for this helper's profile and the given file size"""
+        return get_transfer_profile(self.transfer_profile, file_size).transfer_config()
+
     def upload_file(self, file_obj, s3_path, bucket_name, callback=None):
         try:
+            file_obj.seek(0, os.SEEK_END)
+            file_size = file_obj.tell()
+            file_obj.seek(0)
+            replaced = self.replaced_size(bucket_name, s3_path)
+
             self.s3_client.upload_fileobj(
                 file_obj,
                 bucket_name,
                 s3_path,
-                Callback=callback
+                Callback=callback,
+                Config=self.transfer_config(file_size)
             )
         except Exception as e:
+            self.listing_cache.invalidate(bucket_name, s3_path)
             raise Exception(f"Failed to upload file: {str(e)}")
+        # The new object is folded into cached listings, so the refresh after an upload needs no LIST
+        self.listing_cache.add_object(bucket_name, {'Key': s3_path, 'Size': file_size})
+        self.usage.adjust(bucket_name, s3_path, file_size - replaced, file_size)
     
     def create_folder(self, bucket_name, folder_path):
         try:
@@ -171,28 +365,45 @@ class S3Helper:
                 Key=folder_path
             )
         except Exception as e:
+            self.listing_cache.invalidate(bucket_name, folder_path)
             raise Exception(f"Failed to create folder: {str(e)}")
+        self.listing_cache.add_object(bucket_name, {'Key': folder_path, 'Size': 0})
         
     def download_file(self, bucket_name, object_key, local_path, callback=None):
         try:
-            file_size = self.s3_client.head_object(Bucket=bucket_name, Key=object_key)['ContentLength']
-            
+            head = self.s3_client.head_object(Bucket=bucket_name, Key=object_key)
+            file_size = head['ContentLength']
+            downloaded = 0
+            lock = threading.Lock()
+
+            # Ranges report chunk sizes from several threads; callers get running totals
             def progress_wrapper(bytes_amount):
+                nonlocal downloaded
+                with lock:
+                    downloaded += bytes_amount
+                    total = downloaded
                 if callback:
-                    callback(bytes_amount, file_size)
-            
-            self.s3_client.download_file(
+                    callback(total, file_size)
+
+            profile = get_transfer_profile(self.transfer_profile, file_size)
+            downloader = RangedDownloader(
+                self.s3_client,
+                range_size=profile.multipart_chunksize,
+                max_concurrency=profile.max_concurrency
+            )
+            downloader.download(
                 bucket_name,
                 object_key,
                 local_path,
-                Callback=progress_wrapper
+                callback=progress_wrapper,
+                head=head
             )
         except Exception as e:
             raise Exception(f"Failed to download file: {str(e)}")    
 
 
 class FileDownloaderApp:
-    def __init__(self, username):
+    def __init__(self, username, transfer_profile=None):
         self.root = tkdnd.Tk()
         self.root.configure(bg='white')  # Set root background to white
         self.theme = ModernTheme(self.root)
@@ -200,7 +411,8 @@ class FileDownloaderApp:
         self.current_file = None
         self.selected_bucket = None
         self.current_folder = ""
-        self.s3_helper = S3Helper()
+        self.s3_helper = S3Helper(transfer_profile, quota_user=username)
+        self.hash_cache = HashCache()
         self.storage_limit = 1024 * 1024 * 1024  # 1GB default limit
         self.upload_history = []
         self.history_labels = []
@@ -208,9 +420,16 @@ class FileDownloaderApp:
         self.setup_window()
         self.create_widgets()
         self.update_queue = queue.Queue()
+        # S3 calls made for the UI run here; results come back through update_queue
+        self.background = BackgroundExecutor(self.update_queue)
+        self.listing_id = 0
+        self.listing_rows = set()
+        self.shown_folder = None
+        self.download_pool = TransferPool(self.update_queue, max_workers=self.s3_helper.pool_workers, kind='download')
         self.process_queue()
         self.dragged_item = None
         self.drag_indicator = None
+        self.move_window = None
         self.last_highlight = None
         self.current_storage_usage = 0
         self.update_current_storage_usage()
@@ -218,6 +437,7 @@ class FileDownloaderApp:
         self.bucket_tree.tag_configure('valid_target', background='#e0ffe0')  # Light green
         self.bucket_tree.tag_configure('invalid_target', background='#ffe0e0') 
         self.load_buckets()
+        self.root.after(500, self.check_interrupted_moves)
         
     def close_context_menu(self, event):
         self.context_menu.unpost()    
@@ -287,6 +507,9 @@ class FileDownloaderApp:
         
         # Create file upload section
         # self.create_file_upload_section(main_frame)
+
+        # Create download progress section
+        self.create_download_section(main_frame)
         
         # Create history section
         self.create_history_section(main_frame)
@@ -386,6 +609,9 @@ class FileDownloaderApp:
         # Current path label
         self.path_label = ttk.Label(right_panel, text="")
         self.path_label.grid(row=1, column=0, sticky="w", pady=(0, 10))
+        # Rows loaded into the tree versus rows listed so far
+        self.listing_label = ttk.Label(right_panel, text="")
+        self.listing_label.grid(row=1, column=0, sticky="e", pady=(0, 10))
 
         # Bucket contents tree
         self.bucket_tree = ttk.Treeview(
@@ -423,6 +649,10 @@ class FileDownloaderApp:
         )
         self.bucket_tree.heading("Size", text="Size")
         self.bucket_tree.grid(row=2, column=0, sticky="nsew")
+        # Huge folders only ever put the rows around the viewport into the widget
+        self.bucket_rows = VirtualTreeview(self.bucket_tree, tree_scrollbar)
+        # Listed rows go in a few milliseconds at a time so the UI keeps up
+        self.row_loader = ProgressiveLoader(self.bucket_rows, on_progress=self.show_listing_progress)
         
         # self.context_menu.config(
         #     bg="white",        # Menu background
@@ -445,33 +675,36 @@ class FileDownloaderApp:
 
     def load_buckets(self):
         """Load and display available S3 buckets"""
-        try:
+        def show_buckets(buckets):
             self.bucket_listbox.delete(0, tk.END)
-            buckets = self.s3_helper.list_buckets()
             for bucket in buckets:
                 self.bucket_listbox.insert(tk.END, bucket)
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load buckets: {str(e)}")
+
+        self.background.submit(
+            self.s3_helper.list_buckets,
+            on_done=show_buckets,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to load buckets: {str(e)}")
+        )
             
             
     def update_current_storage_usage(self):
-        """Update the current storage usage value"""
-        try:
-            self.current_storage_usage = self.get_current_storage_usage()
-            self.update_storage_display()
-        except Exception as e:
-            print(f"Error updating storage usage: {str(e)}")        
-            
-    def on_bucket_select(self, event):
-        """Handle bucket selection"""
-        selection = self.bucket_listbox.curselection()
-        if selection:
-            self.selected_bucket = self.bucket_listbox.get(selection[0])
-            self.current_folder = ""  # Reset current folder
-            self.refresh_bucket_contents()  # Ensure bucket contents are loaded
-            self.update_path_label()        
-            
+        """Total up the selected bucket's storage usage in the background, once per bucket"""
+        bucket_name = self.selected_bucket
+        if not bucket_name or not self.s3_helper.usage.begin_seed(bucket_name):
+            return
+
+        def seed():
+            try:
+                objects = self.s3_helper.iter_objects(bucket_name)
+                self.s3_helper.usage.seed(bucket_name, objects)
+                self.update_queue.put(('storage_seeded', bucket_name))
+            except Exception as e:
+                self.update_queue.put(('error', f"Failed to get storage usage: {str(e)}"))
 
+        seeder = threading.Thread(target=seed)
+        seeder.daemon = True
+        seeder.start()
+            
     def create_file_upload_section(self, parent):
         upload_frame = ttk.LabelFrame(parent, text="File Upload", padding="20")
         upload_frame.grid(row=2, column=0, sticky="ew", pady=10)
@@ -506,57 +739,42 @@ class FileDownloaderApp:
         self.status_label = ttk.Label(upload_frame, text="")
         self.status_label.grid(row=3, column=0, columnspan=3, pady=5)
 
-    def create_history_section(self, parent):
-        history_frame = ttk.LabelFrame(parent, text="Upload History", padding="20")
-        history_frame.grid(row=3, column=0, sticky="ew", pady=10)
-        self.history_frame = ttk.Frame(history_frame)
-        self.history_frame.grid(row=0, column=0, sticky="ew")
-        
-    def delete_folder(self):
-        if not self.selected_bucket:
-            messagebox.showerror("Error", "Please select a bucket first")
-            return
-
-        # Ensure we are selecting a folder to delete
-        selected_items = self.bucket_tree.selection()
-        if not selected_items:
-            messagebox.showerror("Error", "No folder selected")
-            return
+    def create_download_section(self, parent):
+        download_frame = ttk.LabelFrame(parent, text="Downloads", padding="20")
+        download_frame.grid(row=2, column=0, sticky="ew", pady=10)
 
-        # Get the selected folder
-        selected_item = selected_items[0]
-        item_text = self.bucket_tree.item(selected_item)["text"]
-        values = self.bucket_tree.item(selected_item)["values"]
+        # Progress bar (shown while a download is running)
+        self.progress_bar = ttk.Progressbar(
+            download_frame,
+            orient="horizontal",
+            length=300,
+            mode="determinate"
+        )
 
-        # Check if it's a folder (folders in S3 usually have "/" at the end of their name)
-        if not values or values[0] != "Folder":
-            messagebox.showerror("Error", "Selected item is not a folder")
-            return
+        cancel_button = ttk.Button(download_frame, text="Cancel Download", command=self.cancel_download)
+        cancel_button.grid(row=0, column=0, padx=10, pady=10, sticky="w")
 
-        folder_to_delete = f"{self.current_folder}{item_text}/"
+        sync_btn = ttk.Button(download_frame, text="Sync Folder", command=self.sync_folder)
+        sync_btn.grid(row=0, column=1, padx=10, pady=10, sticky="w")
 
-        # Ask for confirmation
-        confirm = messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete the folder '{folder_to_delete}' and all its contents?")
-        if not confirm:
-            return
+        # Status label
+        self.status_label = ttk.Label(download_frame, text="")
+        self.status_label.grid(row=3, column=0, columnspan=3, pady=5)
 
-        # Perform the delete operation
-        try:
-            objects_to_delete = self.s3_helper.list_bucket_contents(self.selected_bucket, folder_to_delete)
-            if not objects_to_delete:
-                messagebox.showinfo("Info", "Folder is already empty")
-                return
+        # Aggregate transfer rate and ETA
+        self.rate_label = ttk.Label(download_frame, text="")
+        self.rate_label.grid(row=4, column=0, columnspan=3, pady=5)
 
-            # Delete all objects in the folder
-            delete_objects = {'Objects': [{'Key': obj['Key']} for obj in objects_to_delete]}
-            self.s3_helper.s3_client.delete_objects(Bucket=self.selected_bucket, Delete=delete_objects)
+    def cancel_download(self):
+        self.download_pool.cancel()
+        self.status_label.config(text="Cancelling Download...")
 
-            messagebox.showinfo("Success", f"Folder '{folder_to_delete}' deleted successfully")
-            self.refresh_bucket_contents()  # Refresh the bucket contents after deletion
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to delete folder: {str(e)}")
+    def create_history_section(self, parent):
+        history_frame = ttk.LabelFrame(parent, text="Upload History", padding="20")
+        history_frame.grid(row=3, column=0, sticky="ew", pady=10)
+        self.history_frame = ttk.Frame(history_frame)
+        self.history_frame.grid(row=0, column=0, sticky="ew")
         
-
     def select_file(self):
         file_path = filedialog.askopenfilename()
         if file_path:
@@ -575,11 +793,13 @@ class FileDownloaderApp:
                 if self.current_folder
                 else f"{folder_name}/"
             )
-            try:
-                self.s3_helper.create_folder(self.selected_bucket, folder_path)
-                self.refresh_bucket_contents()
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to create folder: {str(e)}")
+            self.background.submit(
+                self.s3_helper.create_folder,
+                self.selected_bucket,
+                folder_path,
+                on_done=lambda _: self.refresh_bucket_contents(),
+                on_error=lambda e: messagebox.showerror("Error", f"Failed to create folder: {str(e)}")
+            )
                 
     def on_tree_double_click(self, event):
         """Handle double click on tree items"""
@@ -640,6 +860,7 @@ class FileDownloaderApp:
             self.current_folder = ""  # Reset current folder
             self.refresh_bucket_contents()  # Ensure bucket contents are loaded
             self.update_path_label()  # Show the current path in the label
+            self.update_current_storage_usage()
 
 
     def format_size(self, size_bytes):
@@ -650,41 +871,11 @@ class FileDownloaderApp:
         return f"{size_bytes:.2f} TB"
 
     def get_current_storage_usage(self):
-        """Calculate total storage usage for the current bucket"""
-        try:
-            if not self.selected_bucket:
-                return 0
-                
-            total_size = 0
-            paginator = self.s3_helper.s3_client.get_paginator('list_objects_v2')
-            
-            # List all objects in the bucket (not just current folder)
-            pages = paginator.paginate(Bucket=self.selected_bucket)
-            
-            for page in pages:
-                for obj in page.get('Contents', []):
-                    size = obj.get('Size', 0)
-                    if isinstance(size, str):
-                        # Convert string sizes (like "124.00 B") to bytes
-                        try:
-                            if 'KB' in size:
-                                size = float(size.replace(' KB', '')) * 1024
-                            elif 'MB' in size:
-                                size = float(size.replace(' MB', '')) * 1024 * 1024
-                            elif 'GB' in size:
-                                size = float(size.replace(' GB', '')) * 1024 * 1024 * 1024
-                            elif 'B' in size:
-                                size = float(size.replace(' B', ''))
-                        except ValueError:
-                            size = 0
-                    total_size += size
-                    
-            return total_size
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to get storage usage: {str(e)}")
+        """Bytes stored in the current bucket, as last totalled by the usage accountant"""
+        if not self.selected_bucket:
             return 0
+        return self.s3_helper.usage.usage(self.selected_bucket)
 
-    
     def update_storage_display(self):
         """Update the storage usage display"""
         try:
@@ -701,9 +892,10 @@ class FileDownloaderApp:
             
     def refresh_bucket_contents(self):
         if self.selected_bucket:
-            # Clear existing items
-            for item in self.bucket_tree.get_children():
-                self.bucket_tree.delete(item)
+            # Re-listing the folder on screen is diffed into its rows; another folder starts empty
+            if self.shown_folder != (self.selected_bucket, self.current_folder):
+                self.bucket_rows.clear()
+                self.shown_folder = (self.selected_bucket, self.current_folder)
             
             # Fetch and display objects in the bucket
             self.show_bucket_objects(self.selected_bucket)
@@ -711,55 +903,59 @@ class FileDownloaderApp:
 
 
     def show_bucket_objects(self, bucket_name):
-        try:
-            # Get the objects from the bucket
-            objects = self.s3_helper.list_bucket_contents(
-                bucket_name,
-                prefix=self.current_folder
-            )
-            
-            if objects:
-                folder_structure = {}
-                
-                for obj in objects:
-                    path = obj['Key']
-                    size = self.format_size(obj.get('Size', 0))
-                    
-                    # Skip the current folder itself
-                    if path == self.current_folder:
-                        continue
-
-                    # Remove the current folder prefix from the path
-                    if self.current_folder:
-                        path = path[len(self.current_folder):]
-
-                    parts = path.split('/')
-                    if path.endswith('/'):
-                        # It's a folder
-                        folder_name = parts[0]
-                        if folder_name not in folder_structure:
-                            self.bucket_tree.insert(
-                                "",
-                                "end",
-                                folder_name,
-                                text=folder_name,
-                                values=("Folder",)
-                            )
-                            folder_structure[folder_name] = True
-                    else:
-                        # It's a file
-                        if len(parts) == 1:
-                            self.bucket_tree.insert(
-                                "",
-                                "end",
-                                path,
-                                text=path,
-                                values=(size,)
-                            )
-            else:
-                self.bucket_tree.insert("", "end", text="Empty folder")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to retrieve bucket objects: {str(e)}")
+        """List the current folder in the background; rows arrive as 'listing_page' messages"""
+        self.listing_id += 1
+        listing_id = self.listing_id
+        prefix = self.current_folder
+        self.listing_rows = set()
+        self.row_loader.reset()
+        self.listing_label.config(text="")
+
+        def list_folder():
+            # Only the direct children are listed; sub-folders come back as common prefixes
+            for folders, objects in self.s3_helper.list_folder(bucket_name, prefix=prefix):
+                self.update_queue.put(('listing_page', (listing_id, prefix, folders, objects)))
+
+        self.background.submit(
+            list_folder,
+            on_done=lambda _: self.row_loader.when_loaded(lambda: self.finish_listing(listing_id)),
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to retrieve bucket objects: {str(e)}")
+        )
+
+    def show_tree_rows(self, prefix, folders, objects, shown):
+        """Add (or update) rows for direct children of prefix, adding their ids to shown"""
+        # A key 'foo' and a folder 'foo/' can sit side by side, so folders and files get separate ids
+        rows = []
+        for folder in folders:
+            folder_name = folder[len(prefix):].rstrip('/')
+            iid = f"d:{folder}"
+            rows.append((iid, folder_name, ("Folder",)))
+            shown.add(iid)
+
+        for obj in objects:
+            # Skip the current folder itself
+            path = obj['Key'][len(prefix):]
+            if not path:
+                continue
+            iid = f"f:{obj['Key']}"
+            rows.append((iid, path, (self.format_size(obj.get('Size', 0)),)))
+            shown.add(iid)
+        self.row_loader.add(rows)
+
+    def show_listing_progress(self, loaded, known):
+        if loaded < known:
+            self.listing_label.config(text=f"Loaded {loaded} of {known} items")
+        else:
+            self.listing_label.config(text=f"{known} items")
+
+    def finish_listing(self, listing_id):
+        if listing_id != self.listing_id:
+            return
+        # Rows still shown from before the refresh that are no longer listed
+        self.bucket_rows.retain(self.listing_rows)
+        if not self.listing_rows:
+            self.bucket_rows.set_placeholder("Empty folder")
+
     def move_s3_object(self, source_key, target_key):
         """
         Logic to move an object within an S3 bucket.
@@ -870,27 +1066,25 @@ class FileDownloaderApp:
         if not messagebox.askyesno("Confirm Delete", msg):
             return
 
-        try:
+        bucket_name = self.selected_bucket
+
+        def delete():
             if values and values[0] == "Folder":
                 # Delete folder and its contents
-                objects = self.s3_helper.list_bucket_contents(self.selected_bucket, full_path)
-                if objects:
-                    delete_objects = {'Objects': [{'Key': obj['Key']} for obj in objects]}
-                    self.s3_helper.s3_client.delete_objects(
-                        Bucket=self.selected_bucket,
-                        Delete=delete_objects
-                    )
+                self.s3_helper.delete_prefix(bucket_name, full_path, self.report_delete_progress)
             else:
                 # Delete single file
-                self.s3_helper.s3_client.delete_object(
-                    Bucket=self.selected_bucket,
-                    Key=full_path
-                )
+                self.s3_helper.delete_object(bucket_name, full_path)
 
+        def deleted(_):
             messagebox.showinfo("Success", f"Successfully deleted {item_text}")
             self.refresh_bucket_contents()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to delete: {str(e)}")   
+
+        self.background.submit(
+            delete,
+            on_done=deleted,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to delete: {str(e)}")
+        )
                      
     def download_selected_item(self):
         """Download the selected file or folder"""
@@ -902,9 +1096,9 @@ class FileDownloaderApp:
         item_text = self.bucket_tree.item(item)["text"]
         values = self.bucket_tree.item(item)["values"]
 
-        # Don't allow downloading folders directly
+        # Folders are downloaded recursively through the download pool
         if values and values[0] == "Folder":
-            messagebox.showerror("Error", "Cannot download folders directly. Please download individual files.")
+            self.download_folder(f"{self.current_folder}{item_text}/", item_text)
             return
 
         # Construct full path
@@ -931,6 +1125,109 @@ class FileDownloaderApp:
         )
         download_thread.daemon = True
         download_thread.start()  
+    def download_folder(self, folder_path, folder_name):
+        """Download every object under folder_path, recreating the tree locally"""
+        target_dir = filedialog.askdirectory(title="Download Folder To")
+        if not target_dir:
+            return
+
+        local_root = os.path.join(target_dir, folder_name)
+        os.makedirs(local_root, exist_ok=True)
+
+        self.progress_bar.grid(row=2, column=0, columnspan=3, padx=10, pady=10)
+        self.progress_bar['value'] = 0
+        self.status_label.config(text=f"Downloading {folder_name}...")
+
+        # Keys are listed page by page while the pool is already fetching
+        bucket_name = self.selected_bucket
+        jobs = self.iter_download_jobs(bucket_name, folder_path, local_root)
+        self.download_pool.submit_many(
+            jobs,
+            lambda job, callback: self.perform_download_job(job, callback, bucket_name)
+        )
+
+    def iter_download_jobs(self, bucket_name, prefix, local_root):
+        """Lazily map every key under prefix to a path below local_root"""
+        local_root = os.path.abspath(local_root)
+        for obj in self.s3_helper.iter_objects(bucket_name, prefix):
+            relative = obj['Key'][len(prefix):]
+            local_path = os.path.abspath(os.path.join(local_root, *relative.split('/')))
+            # Never write outside the chosen folder (e.g. keys containing '..')
+            if os.path.commonpath([local_root, local_path]) != local_root:
+                continue
+            if obj['Key'].endswith('/'):
+                os.makedirs(local_path, exist_ok=True)
+                continue
+            yield TransferJob(
+                name=relative,
+                size=obj.get('Size', 0),
+                source=obj['Key'],
+                target=local_path
+            )
+
+    def perform_download_job(self, job, progress_callback, bucket_name):
+        """Download one file of a folder download from bucket_name (runs on a download pool worker)"""
+        os.makedirs(os.path.dirname(job.target), exist_ok=True)
+        reported = 0
+        lock = threading.Lock()
+
+        # download_file reports running totals, the pool expects increments
+        def running_total(bytes_downloaded, total_bytes):
+            nonlocal reported
+            with lock:
+                delta = bytes_downloaded - reported
+                reported = max(reported, bytes_downloaded)
+            if delta > 0:
+                progress_callback(delta)
+
+        self.s3_helper.download_file(
+            bucket_name,
+            job.source,
+            job.target,
+            callback=running_total
+        )
+        if job.mtime is not None:
+            # Keep the object's timestamp so the next sync sees the file as unchanged
+            os.utime(job.target, (job.mtime, job.mtime))
+
+    def sync_folder(self):
+        """Sync a local folder with the current S3 folder, transferring only differences"""
+        if not self.selected_bucket:
+            messagebox.showerror("Error", "Please select a bucket first")
+            return
+
+        local_root = filedialog.askdirectory(title="Folder to Sync")
+        if not local_root:
+            return
+
+        direction = SYNC_PULL
+        delete = messagebox.askyesno(
+            "Sync Folder",
+            "Also delete local files that no longer exist in the current S3 folder?"
+        )
+
+        bucket_name = self.selected_bucket
+        engine = SyncEngine(
+            self.s3_helper.s3_client,
+            bucket_name,
+            self.current_folder,
+            local_root,
+            direction=direction,
+            delete=delete,
+            hash_cache=self.hash_cache,
+            on_remote_delete=self.s3_helper.objects_deleted,
+            on_local_error=lambda key, error: self.update_queue.put(('file_error', ('download', key, error)))
+        )
+
+        self.progress_bar.grid(row=2, column=0, columnspan=3, padx=10, pady=10)
+        self.progress_bar['value'] = 0
+        self.status_label.config(text="Comparing...")
+
+        self.download_pool.submit_many(
+            engine.iter_jobs(),
+            lambda job, callback: self.perform_download_job(job, callback, bucket_name)
+        )
+
     def perform_download(self, s3_path, local_path):
         try:
             def progress_callback(bytes_downloaded, total_bytes):
@@ -977,20 +1274,27 @@ class FileDownloaderApp:
             return
 
         # Perform the delete operation
-        try:
-            objects_to_delete = self.s3_helper.list_bucket_contents(self.selected_bucket, folder_to_delete)
-            if not objects_to_delete:
-                messagebox.showinfo("Info", "Folder is already empty")
-                return
+        bucket_name = self.selected_bucket
 
-            # Delete all objects in the folder
-            delete_objects = {'Objects': [{'Key': obj['Key']} for obj in objects_to_delete]}
-            self.s3_helper.s3_client.delete_objects(Bucket=self.selected_bucket, Delete=delete_objects)
+        def delete():
+            return self.s3_helper.delete_prefix(bucket_name, folder_to_delete, self.report_delete_progress)
 
+        def deleted(count):
+            if not count:
+                messagebox.showinfo("Info", "Folder is already empty")
+                return
             messagebox.showinfo("Success", f"Folder '{folder_to_delete}' deleted successfully")
             self.refresh_bucket_contents()  # Refresh the bucket contents after deletion
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to delete folder: {str(e)}")    
+
+        self.background.submit(
+            delete,
+            on_done=deleted,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to delete folder: {str(e)}")
+        )
+
+    def report_delete_progress(self, deleted, failed):
+        self.update_queue.put(('delete_progress', (deleted, failed)))
+
     def on_start_drag(self, event):
         """Handle the start of drag operation"""
         item = self.bucket_tree.identify_row(event.y)
@@ -1036,9 +1340,9 @@ class FileDownloaderApp:
         # Auto-scroll the tree if near the edges
         tree_height = self.bucket_tree.winfo_height()
         if event.y < 20:  # Near top
-            self.bucket_tree.yview_scroll(-1, 'units')
+            self.bucket_rows.yview_scroll(-1, 'units')
         elif event.y > tree_height - 20:  # Near bottom
-            self.bucket_tree.yview_scroll(1, 'units')            
+            self.bucket_rows.yview_scroll(1, 'units')
 
     def on_drop(self, event):
         """Handle the drop operation"""
@@ -1097,46 +1401,25 @@ class FileDownloaderApp:
             if source_values and source_values[0] == "Folder":
                 target_path += "/"
 
-            try:
-                # Copy object to new location
-                copy_source = {'Bucket': self.selected_bucket, 'Key': source_path}
-                self.s3_helper.s3_client.copy_object(
-                    CopySource=copy_source,
-                    Bucket=self.selected_bucket,
-                    Key=target_path
-                )
-
-                # Delete original object
-                self.s3_helper.s3_client.delete_object(
-                    Bucket=self.selected_bucket,
-                    Key=source_path
-                )
+            bucket_name = self.selected_bucket
+            if source_values and source_values[0] == "Folder":
+                # Folders are copied in parallel and removed only once every copy succeeded
+                self.move_folder(bucket_name, source_path, target_path, source_text)
+                return
 
-                # If it's a folder, move all contents
-                if source_values and source_values[0] == "Folder":
-                    objects = self.s3_helper.list_bucket_contents(self.selected_bucket, source_path)
-                    for obj in objects:
-                        old_key = obj['Key']
-                        new_key = old_key.replace(source_path, target_path, 1)
-                        
-                        # Copy object to new location
-                        copy_source = {'Bucket': self.selected_bucket, 'Key': old_key}
-                        self.s3_helper.s3_client.copy_object(
-                            CopySource=copy_source,
-                            Bucket=self.selected_bucket,
-                            Key=new_key
-                        )
-                        
-                        # Delete original object
-                        self.s3_helper.s3_client.delete_object(
-                            Bucket=self.selected_bucket,
-                            Key=old_key
-                        )
+            def move():
+                # Copy object to new location, then delete the original
+                self.s3_helper.move_object(bucket_name, source_path, target_path)
 
+            def moved(_):
                 messagebox.showinfo("Success", f"Successfully moved {source_text}")
                 self.refresh_bucket_contents()
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to move item: {str(e)}")
+
+            self.background.submit(
+                move,
+                on_done=moved,
+                on_error=lambda e: messagebox.showerror("Error", f"Failed to move item: {str(e)}")
+            )
 
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred during drop operation: {str(e)}")
@@ -1144,6 +1427,114 @@ class FileDownloaderApp:
             self.dragged_item = None
     
 
+    def move_folder(self, bucket_name, source_prefix, target_prefix, name):
+        """Move a folder in the background behind a progress window with a Cancel button"""
+        self.run_move(
+            f"Moving {name}",
+            self.s3_helper.move_prefix,
+            (bucket_name, source_prefix, target_prefix),
+            f"Successfully moved {name}",
+            cancel_event=threading.Event()
+        )
+
+    def check_interrupted_moves(self):
+        """Offer to resume or roll back a folder move that was cut short, e.g. by a crash"""
+        if self.move_window:
+            return
+        try:
+            moves = self.s3_helper.move_journal.pending_moves()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to read the move journal: {str(e)}")
+            return
+        if not moves:
+            return
+
+        move = moves[0]
+        counts = move['counts']
+        copied = counts.get('copied', 0) + counts.get('deleting', 0) + counts.get('deleted', 0)
+        answer = messagebox.askyesnocancel(
+            "Interrupted Move",
+            f"Moving '{move['source_prefix']}' to '{move['target_prefix']}' in {move['bucket']} was interrupted "
+            f"({copied} of {sum(counts.values())} object(s) copied, {counts.get('deleted', 0)} original(s) removed).\n\n"
+            "Yes finishes the move, No rolls it back, Cancel asks again on the next launch."
+        )
+        if answer is None:
+            return
+        if answer:
+            self.run_move(
+                "Resuming move",
+                self.s3_helper.resume_move,
+                (move,),
+                f"Finished moving '{move['source_prefix']}'",
+                on_finish=self.check_interrupted_moves
+            )
+        else:
+            self.run_move(
+                "Rolling back move",
+                self.s3_helper.roll_back_move,
+                (move,),
+                f"Restored '{move['source_prefix']}'",
+                on_finish=self.check_interrupted_moves
+            )
+
+    def run_move(self, title, move, args, success_message, cancel_event=None, on_finish=None):
+        """Run a move (or its recovery) in the background behind a progress window"""
+        if self.move_window:
+            messagebox.showerror("Error", "Another folder is still being moved")
+            return
+
+        cancel = cancel_event.set if cancel_event else (lambda: None)
+        self.move_window = tk.Toplevel(self.root)
+        self.move_window.title(title)
+        self.move_window.transient(self.root)
+        self.move_window.resizable(False, False)
+        self.move_window.protocol("WM_DELETE_WINDOW", cancel)
+        self.move_label = ttk.Label(self.move_window, text="Listing folder...")
+        self.move_label.pack(padx=10, pady=(10, 5), fill="x")
+        self.move_progress = ttk.Progressbar(self.move_window, length=300, mode="determinate")
+        self.move_progress.pack(padx=10, pady=5)
+        self.move_cancel_button = ttk.Button(self.move_window, text="Cancel", command=cancel)
+        self.move_cancel_button.pack(padx=10, pady=(5, 10))
+        if not cancel_event:
+            self.move_cancel_button.state(['disabled'])
+
+        def progress(phase, done, total):
+            self.update_queue.put(('move_progress', (phase, done, total)))
+
+        def moved(_):
+            self.close_move_window()
+            messagebox.showinfo("Success", success_message)
+            self.refresh_bucket_contents()
+            if on_finish:
+                on_finish()
+
+        def failed(e):
+            self.close_move_window()
+            if isinstance(e, MoveCancelled):
+                messagebox.showinfo("Cancelled", "Move cancelled, nothing was changed")
+            else:
+                messagebox.showerror("Error", f"Failed to move item: {str(e)}")
+            self.refresh_bucket_contents()
+
+        kwargs = {'cancel_event': cancel_event} if cancel_event else {}
+        self.background.submit(move, *args, callback=progress, on_done=moved, on_error=failed, **kwargs)
+
+    def show_move_progress(self, phase, done, total):
+        if not self.move_window:
+            return
+        if phase == MOVE_DELETING:
+            # Every copy exists at this point, the originals have to go
+            self.move_cancel_button.state(['disabled'])
+            self.move_label.config(text=f"Removing originals: {done}/{total}")
+        else:
+            self.move_label.config(text=f"Copying: {done}/{total}")
+        self.move_progress['value'] = done * 100 / total if total else 100
+
+    def close_move_window(self):
+        if self.move_window:
+            self.move_window.destroy()
+            self.move_window = None
+
     def process_queue(self):
         """Process messages from the upload thread"""
         try:
@@ -1158,9 +1549,62 @@ class FileDownloaderApp:
                     self.progress_bar.grid_remove()
                     messagebox.showinfo("Success", f"Successfully downloaded {msg_value}")    
                     
+                elif msg_type == 'storage_seeded':
+                    self.update_storage_display()
+                elif msg_type == 'delete_progress':
+                    deleted, failed = msg_value
+                    text = f"Deleted {deleted} object(s)"
+                    if failed:
+                        text += f", {failed} failed"
+                    self.status_label.config(text=text)
+                elif msg_type == 'move_progress':
+                    self.show_move_progress(*msg_value)
+                elif msg_type == 'background_done':
+                    BackgroundExecutor.deliver(msg_value, default_error=lambda e: messagebox.showerror("Error", str(e)))
+                elif msg_type == 'listing_page':
+                    listing_id, prefix, folders, objects = msg_value
+                    if listing_id == self.listing_id:
+                        self.show_tree_rows(prefix, folders, objects, self.listing_rows)
                 elif msg_type == 'storage_update':
                     self.current_storage_usage = msg_value
                     self.update_storage_display()
+
+                elif msg_type == 'throughput':
+                    kind, rate, eta = msg_value
+                    self.rate_label.config(text=f"{self.format_size(rate)}/s, ETA {format_duration(eta)}")
+
+                elif msg_type == 'file_progress':
+                    kind, file_name, progress = msg_value
+                    verb = "Uploading" if kind == 'upload' else "Downloading"
+                    self.status_label.config(text=f"{verb} {file_name} ({progress:.0f}%)")
+
+                elif msg_type == 'file_success':
+                    kind, file_name = msg_value
+                    if kind == 'upload':
+                        self.add_history_entry(f"Uploaded: {file_name}")
+                        self.upload_history.append(file_name)
+
+                elif msg_type == 'file_skipped':
+                    kind, file_name = msg_value
+                    self.add_history_entry(f"Already present: {file_name}")
+
+                elif msg_type == 'file_error':
+                    kind, file_name, error = msg_value
+                    self.add_history_entry(f"Failed: {file_name} ({error})")
+
+                elif msg_type == 'queue_done':
+                    kind, succeeded, failed, cancelled, skipped = msg_value
+                    verb = "Uploaded" if kind == 'upload' else "Downloaded"
+                    summary = f"{verb} {succeeded} file(s)"
+                    if failed:
+                        summary += f", {failed} failed"
+                    if skipped:
+                        summary += f", {skipped} already present"
+                    if cancelled:
+                        summary += f", {cancelled} cancelled"
+                    self.status_label.config(text=summary)
+                    self.rate_label.config(text="")
+                    self.progress_bar.grid_remove()
                     
                 elif msg_type == 'success':
                     self.status_label.config(text="Upload Successful")
@@ -1190,6 +1634,14 @@ class FileDownloaderApp:
             # Schedule the next queue check
             self.root.after(100, self.process_queue)
 
+    def add_history_entry(self, text):
+        new_label = ttk.Label(
+            self.history_frame,
+            text=f"{text} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        )
+        new_label.grid(sticky="w")
+        self.history_labels.append(new_label)
+
     def show_success(self, file_name):
         self.status_label.config(text="Upload Successful")
         new_label = ttk.Label(
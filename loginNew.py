@@ -19,13 +19,15 @@ def login_screen():
 
         if 'Item' in response and response['Item']['password'] == password:
             user_type = response['Item']['access_level']
+            # Optional per-user multipart profile, see utils/transfer_config.py
+            transfer_profile = response['Item'].get('transfer_profile')
             root.destroy()  # Close login window
             if user_type == 'push':
-                FileUploaderApp(username, bucket_access=response['Item']['bucket_access'], upload_limit=response['Item']['upload_limit'], folder_access=response['Item']['folder_access'])
+                FileUploaderApp(username, bucket_access=response['Item']['bucket_access'], upload_limit=response['Item']['upload_limit'], folder_access=response['Item']['folder_access'], transfer_profile=transfer_profile)
             elif user_type == 'pull':
-                FileDownloaderApp(username)
+                FileDownloaderApp(username, transfer_profile=transfer_profile)
             else:
-                CombinedInterface(username, bucket_access=response['Item']['bucket_access'], upload_limit=response['Item']['upload_limit'])
+                CombinedInterface(username, bucket_access=response['Item']['bucket_access'], upload_limit=response['Item']['upload_limit'], transfer_profile=transfer_profile)
         else:
             error_label.config(text="Invalid credentials", fg="red")
 
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import time
+import unittest
+
+from utils import ranged_download
+from utils.ranged_download import RangedDownloader
+
+
+class SlowBody:
+    """Streaming body that hands out a few bytes at a time, yielding between reads"""
+
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def read(self, size):
+        time.sleep(0)
+        chunk = self.data[self.offset:self.offset + 7]
+        self.offset += len(chunk)
+        return chunk
+
+    def close(self):
+        pass
+
+
+class FakeS3:
+    def __init__(self, data):
+        self.data = data
+
+    def head_object(self, Bucket, Key, **kwargs):
+        # Not an MD5 ETag, so only the size is verified and the bytes must be checked here
+        return {'ContentLength': len(self.data), 'ETag': '"not-an-md5"'}
+
+    def get_object(self, Bucket, Key, Range, IfMatch):
+        start, end = (int(value) for value in Range[len('bytes='):].split('-'))
+        return {'Body': SlowBody(self.data[start:end + 1])}
+
+
+class PwriteFallbackTest(unittest.TestCase):
+    def setUp(self):
+        # Force the seek+write path used where os.pwrite does not exist (Windows)
+        self.pwrite = getattr(os, 'pwrite', None)
+        if self.pwrite is not None:
+            del os.pwrite
+        self.addCleanup(self.restore_pwrite)
+
+    def restore_pwrite(self):
+        if self.pwrite is not None:
+            os.pwrite = self.pwrite
+
+    def test_concurrent_ranges_land_at_their_offsets(self):
+        self.assertFalse(hasattr(ranged_download.os, 'pwrite'))
+        data = bytes(range(256)) * 64
+        downloader = RangedDownloader(FakeS3(data), range_size=512, max_concurrency=8)
+        with tempfile.TemporaryDirectory() as directory:
+            local_path = os.path.join(directory, 'object.bin')
+            downloader.download('bucket', 'object.bin', local_path)
+            with open(local_path, 'rb') as file_obj:
+                self.assertEqual(file_obj.read(), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,7 @@
 # user_model.py
 
 class User:
-    def __init__(self, user_id, username, password, access_level, upload_limit=None, bucket_access=None, folder_access=None):
+    def __init__(self, user_id, username, password, access_level, upload_limit=None, bucket_access=None, folder_access=None, transfer_profile=None):
         self.user_id = user_id  # Unique ID for the user
         self.username = username  # Username
         self.password = password  # Password (consider hashing)
@@ -9,6 +9,7 @@ class User:
         self.upload_limit = upload_limit  # Upload limit (optional, e.g., in MB or GB)
         self.bucket_access = bucket_access if bucket_access is not None else []  # List of accessible buckets (optional)
         self.folder_access = folder_access if folder_access is not None else []
+        self.transfer_profile = transfer_profile  # Multipart profile name (optional, see utils/transfer_config.py)
 
     def to_dict(self):
         """Convert the User object to a dictionary for DynamoDB."""
@@ -20,4 +21,5 @@ class User:
             'upload_limit': self.upload_limit,
             'bucket_access': self.bucket_access,
             'folder_access': self.folder_access,
+            'transfer_profile': self.transfer_profile,
         }
@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BackgroundExecutor:
+    """Runs blocking S3 calls off the Tk main thread.
+
+    ``submit`` returns a Future at once. When the call finishes, a
+    ``('background_done', (on_done, on_error, future))`` message is put on
+    ``update_queue``, and the app's process_queue hands it to ``deliver`` so
+    the callbacks run on the main thread where touching widgets is safe.
+    """
+
+    def __init__(self, update_queue, max_workers=4):
+        self.update_queue = update_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='s3-background')
+
+    def submit(self, fn, *args, on_done=None, on_error=None, **kwargs):
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(
+            lambda done: self.update_queue.put(('background_done', (on_done, on_error, done)))
+        )
+        return future
+
+    @staticmethod
+    def deliver(message, default_error=None):
+        """Run the callbacks of a 'background_done' message (main thread only)"""
+        on_done, on_error, future = message
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            handler = on_error or default_error
+            if handler:
+                handler(error)
+        elif on_done:
+            on_done(future.result())
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,220 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+APP_NAME = 's3_file_manager'
+INDEX_FILE = 'bucket_index.sqlite'
+# A bucket is re-listed in the background when its index is older than this
+REFRESH_INTERVAL = 15 * 60
+# Rows read per query while walking a folder
+_BATCH = 1000
+
+
+def user_cache_dir(app_name=APP_NAME):
+    """Per-user cache directory for this app, following each platform's convention"""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, app_name)
+
+
+def _after_folder(folder):
+    """Smallest key sorting after every key under ``folder`` ('/' + 1 == '0')"""
+    return folder[:-1] + '0'
+
+
+class BucketIndex:
+    """Persistent SQLite index of the keys, sizes, ETags and modification times of buckets.
+
+    Folder views can be drawn from the index before S3 has answered. A full
+    re-listing runs in the background (``refresh``) and each live folder
+    listing is written back (``replace_folder``), so the index converges on
+    the bucket without blocking the UI.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            os.makedirs(user_cache_dir(), exist_ok=True)
+            path = os.path.join(user_cache_dir(), INDEX_FILE)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS objects (
+                    bucket TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    etag TEXT,
+                    last_modified REAL,
+                    generation INTEGER NOT NULL,
+                    PRIMARY KEY (bucket, key)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    bucket TEXT PRIMARY KEY,
+                    generation INTEGER NOT NULL,
+                    refreshed_at REAL
+                )
+            """)
+
+    def has_bucket(self, bucket_name):
+        return self._bucket_row(bucket_name) is not None
+
+    def needs_refresh(self, bucket_name, max_age=REFRESH_INTERVAL):
+        row = self._bucket_row(bucket_name)
+        return row is None or row[1] is None or time.time() - row[1] > max_age
+
+    def _bucket_row(self, bucket_name):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT generation, refreshed_at FROM buckets WHERE bucket = ?",
+                (bucket_name,)
+            ).fetchone()
+
+    def _generation(self, bucket_name):
+        row = self._conn.execute(
+            "SELECT generation FROM buckets WHERE bucket = ?", (bucket_name,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def list_folder(self, bucket_name, prefix=''):
+        """(folder prefixes, objects) directly under prefix, shaped like a delimiter listing.
+
+        Sub-folders are skipped over with one indexed seek each, so the cost
+        depends on the number of direct children, not on the size of the tree.
+        """
+        folders, objects = [], []
+        lower, inclusive = prefix, True
+        with self._lock:
+            while True:
+                rows = self._conn.execute(
+                    "SELECT key, size, etag, last_modified FROM objects "
+                    f"WHERE bucket = ? AND key {'>=' if inclusive else '>'} ? ORDER BY key LIMIT ?",
+                    (bucket_name, lower, _BATCH)
+                ).fetchall()
+                if not rows:
+                    break
+                reseek = False
+                for key, size, etag, last_modified in rows:
+                    if not key.startswith(prefix):
+                        return folders, objects
+                    rest = key[len(prefix):]
+                    slash = rest.find('/')
+                    if slash != -1:
+                        folder = prefix + rest[:slash + 1]
+                        folders.append(folder)
+                        lower, inclusive = _after_folder(folder), True
+                        reseek = True
+                        break
+                    if rest:
+                        objects.append({'Key': key, 'Size': size, 'ETag': etag, 'LastModified': last_modified})
+                    lower, inclusive = key, False
+                if not reseek and len(rows) < _BATCH:
+                    break
+        return folders, objects
+
+    def iter_objects(self, bucket_name):
+        """Yield every indexed object of a bucket as a listing dict, in key order"""
+        last_key = ''
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT key, size, etag, last_modified FROM objects "
+                    "WHERE bucket = ? AND key > ? ORDER BY key LIMIT ?",
+                    (bucket_name, last_key, _BATCH)
+                ).fetchall()
+            for key, size, etag, last_modified in rows:
+                yield {'Key': key, 'Size': size, 'ETag': etag, 'LastModified': last_modified}
+            if len(rows) < _BATCH:
+                return
+            last_key = rows[-1][0]
+
+    def refresh(self, s3_client, bucket_name):
+        """Re-list the whole bucket into the index, committing page by page"""
+        with self._lock, self._conn:
+            generation = self._generation(bucket_name) + 1
+            self._conn.execute(
+                "INSERT INTO buckets (bucket, generation, refreshed_at) VALUES (?, ?, NULL) "
+                "ON CONFLICT(bucket) DO UPDATE SET generation = excluded.generation",
+                (bucket_name, generation)
+            )
+
+        paginator = s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket_name):
+            with self._lock, self._conn:
+                self._upsert(bucket_name, page.get('Contents', []), generation)
+
+        # Anything neither seen by this listing nor recorded since it began is gone
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM objects WHERE bucket = ? AND generation < ?",
+                (bucket_name, generation)
+            )
+            self._conn.execute(
+                "UPDATE buckets SET refreshed_at = ? WHERE bucket = ?",
+                (time.time(), bucket_name)
+            )
+
+    def replace_folder(self, bucket_name, prefix, folders, objects):
+        """Make the index agree with a live delimiter listing of prefix"""
+        live_keys = {obj['Key'] for obj in objects}
+        live_folders = set(folders)
+        indexed_folders, indexed_objects = self.list_folder(bucket_name, prefix)
+
+        with self._lock, self._conn:
+            generation = self._generation(bucket_name)
+            self._upsert(bucket_name, objects, generation)
+            self._conn.executemany(
+                "DELETE FROM objects WHERE bucket = ? AND key = ?",
+                [(bucket_name, obj['Key']) for obj in indexed_objects if obj['Key'] not in live_keys]
+            )
+            self._conn.executemany(
+                "DELETE FROM objects WHERE bucket = ? AND key >= ? AND key < ?",
+                [
+                    (bucket_name, folder, _after_folder(folder))
+                    for folder in indexed_folders if folder not in live_folders
+                ]
+            )
+
+    def record(self, bucket_name, objects):
+        """Add or update keys this app has just written (uploads, new folders, copies)"""
+        with self._lock, self._conn:
+            # The current generation keeps them through a refresh that is already running
+            self._upsert(bucket_name, objects, self._generation(bucket_name))
+
+    def forget(self, bucket_name, keys):
+        """Drop keys this app has just deleted"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM objects WHERE bucket = ? AND key = ?",
+                [(bucket_name, key) for key in keys]
+            )
+
+    def _upsert(self, bucket_name, objects, generation):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    bucket_name,
+                    obj['Key'],
+                    obj.get('Size', 0),
+                    obj.get('ETag'),
+                    self._timestamp(obj.get('LastModified')),
+                    generation
+                )
+                for obj in objects
+            ]
+        )
+
+    @staticmethod
+    def _timestamp(value):
+        if value is None or isinstance(value, (int, float)):
+            return value
+        return value.timestamp()
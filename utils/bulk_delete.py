@@ -0,0 +1,128 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Most keys a single DeleteObjects request accepts
+BATCH_SIZE = 1000
+# Per-key errors worth another attempt; anything else (e.g. AccessDenied) is final
+RETRYABLE_CODES = {'InternalError', 'ServiceUnavailable', 'SlowDown', 'RequestTimeout', 'OperationAborted'}
+
+
+def iter_batches(objects, size=BATCH_SIZE):
+    """Pack a stream of objects into lists of at most ``size``"""
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_empty_folders(objects):
+    """Yield the folder markers ('name/' keys) of a key-ordered listing that have nothing under them.
+
+    Listings come back in key order, so everything under a marker directly
+    follows it: walking the prefix tree depth first, a marker's subtree is
+    finished as soon as the next key is not inside it. Only that one pending
+    marker is held, whatever the size of the bucket.
+    """
+    pending = None
+    for obj in objects:
+        if pending is not None and not obj['Key'].startswith(pending['Key']):
+            yield pending
+        pending = obj if obj['Key'].endswith('/') else None
+    if pending is not None:
+        yield pending
+
+
+class BulkDeleter:
+    """Deletes a stream of objects with concurrent 1000-key DeleteObjects requests.
+
+    Objects (listing dicts with Key and Size) are consumed lazily, so deleting
+    a folder only holds the batches in flight in memory while its listing is
+    still being paged. Keys reported back as failed with a transient error
+    code are retried with backoff; whatever still fails is returned.
+    """
+
+    def __init__(self, s3_client, max_concurrency=8, max_attempts=4, on_deleted=None, on_deleting=None):
+        self.s3_client = s3_client
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        # Called with (bucket, [{'Key', 'Size'}, ...]) after each successful batch
+        self.on_deleted = on_deleted
+        # Called with (bucket, batch) before the batch's first DeleteObjects request
+        self.on_deleting = on_deleting
+
+    def delete(self, bucket_name, objects, callback=None, cancel_event=None):
+        """Delete ``objects``; returns (deleted count, [{'Key', 'Code', 'Message'}, ...] failures)
+
+        ``callback(deleted, failed)`` receives running totals after every batch.
+        """
+        totals = {'deleted': 0, 'failed': 0}
+        failures = []
+        lock = threading.Lock()
+
+        def run(batch):
+            deleted, errors = self.delete_batch(bucket_name, batch)
+            with lock:
+                totals['deleted'] += deleted
+                totals['failed'] += len(errors)
+                failures.extend(errors)
+                if callback:
+                    callback(totals['deleted'], totals['failed'])
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='s3-delete') as executor:
+            pending = set()
+            for batch in iter_batches(objects):
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                # Keep the listing only a little ahead of the deletes
+                if len(pending) >= self.max_concurrency * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                pending.add(executor.submit(run, batch))
+            for future in wait(pending).done:
+                future.result()
+
+        return totals['deleted'], failures
+
+    def delete_batch(self, bucket_name, batch):
+        """Delete one batch, retrying failed keys; returns (deleted count, final errors)"""
+        deleted = 0
+        final_errors = []
+        if self.on_deleting:
+            self.on_deleting(bucket_name, batch)
+        for attempt in range(self.max_attempts):
+            if attempt:
+                time.sleep(min(0.5 * 2 ** attempt, 10))
+            try:
+                response = self.s3_client.delete_objects(
+                    Bucket=bucket_name,
+                    Delete={'Objects': [{'Key': obj['Key']} for obj in batch], 'Quiet': True}
+                )
+            except Exception as e:
+                if attempt == self.max_attempts - 1:
+                    raise Exception(f"Failed to delete objects: {str(e)}")
+                continue
+
+            errors = response.get('Errors', [])
+            failed = {error.get('Key') for error in errors}
+            succeeded = [obj for obj in batch if obj['Key'] not in failed]
+            deleted += len(succeeded)
+            if self.on_deleted and succeeded:
+                self.on_deleted(bucket_name, succeeded)
+
+            last_attempt = attempt == self.max_attempts - 1
+            retry = set()
+            for error in errors:
+                if error.get('Code') in RETRYABLE_CODES and not last_attempt:
+                    retry.add(error.get('Key'))
+                else:
+                    final_errors.append(error)
+            if not retry:
+                break
+            batch = [obj for obj in batch if obj['Key'] in retry]
+        return deleted, final_errors
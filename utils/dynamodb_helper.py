@@ -1,4 +1,14 @@
-from aws_config import users_table
+from itertools import islice
+from aws_config import users_table, user_objects_table
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+# TransactWriteItems takes at most 100 items; one is the user's counter
+CHARGES_PER_TRANSACTION = 98
+# Cancellation reasons that mean a charge changed under us, not a bad request
+RETRY_REASONS = {'None', 'ConditionalCheckFailed', 'TransactionConflict'}
+# Returned when a charge could not be counted because the user's counter is not seeded
+UNSEEDED = object()
 
 def register_user(username, password, user_type):
     """
@@ -54,3 +64,310 @@ def authenticate_user(username, password):
     except Exception as e:
         print(f"Error authenticating user: {e}")
         return None
+
+def get_storage_used(username):
+    """
+    Reads the bytes a user currently has stored or reserved.
+
+    Args:
+        username (str): The username of the user.
+
+    Returns:
+        int: The user's used_bytes counter, or None if it was never seeded (see seed_storage).
+    """
+    response = users_table.get_item(
+        Key={'username': username},
+        ProjectionExpression='used_bytes',
+        ConsistentRead=True
+    )
+    used = response.get('Item', {}).get('used_bytes')
+    return None if used is None else int(used)
+
+def reserve_storage(username, size, limit):
+    """
+    Atomically reserves bytes against a user's storage limit before a transfer.
+
+    The reservation is counted in used_bytes straight away, so concurrent
+    uploaders cannot overshoot the limit between them. Every successful
+    reservation must be settled by charge_object or given back with release_storage.
+    Nothing can be reserved until the counter has been seeded.
+
+    Args:
+        username (str): The username of the user.
+        size (int): Bytes about to be uploaded.
+        limit (int): The user's storage limit in bytes.
+
+    Returns:
+        bool: True if the bytes were reserved, False if they would exceed the limit
+            or the counter has not been seeded.
+    """
+    room = limit - size
+    if room < 0:
+        return False
+    try:
+        users_table.update_item(
+            Key={'username': username},
+            UpdateExpression='ADD used_bytes :size, reserved_bytes :size',
+            ConditionExpression='used_bytes <= :room',
+            ExpressionAttributeValues={':size': size, ':room': room}
+        )
+        return True
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+def release_storage(username, size):
+    """
+    Gives back a reservation whose upload failed or was cancelled.
+
+    Args:
+        username (str): The username of the user.
+        size (int): Bytes that were reserved.
+    """
+    users_table.update_item(
+        Key={'username': username},
+        UpdateExpression='ADD used_bytes :size, reserved_bytes :size',
+        ExpressionAttributeValues={':size': -size}
+    )
+
+def _object_id(bucket, key):
+    return f"{bucket}#{key}"
+
+def _read_charges(username, object_ids):
+    """Charged sizes of the given UserObjects ids, read consistently"""
+    charges = {}
+    client = user_objects_table.meta.client
+    keys = [{'username': username, 'object_key': object_id} for object_id in dict.fromkeys(object_ids)]
+    while keys:
+        request = {user_objects_table.name: {'Keys': keys[:100], 'ConsistentRead': True}}
+        keys = keys[100:]
+        while request:
+            response = client.batch_get_item(RequestItems=request)
+            for item in response['Responses'].get(user_objects_table.name, []):
+                charges[item['object_key']] = int(item['size'])
+            request = response.get('UnprocessedKeys')
+    return charges
+
+def _transact_charges(username, changes, reserved, counted=True):
+    """One attempt at applying changes; returns the bytes added, None if an item changed meanwhile,
+    or UNSEEDED if the user's counter does not exist yet"""
+    current = _read_charges(username, [object_id for object_id, _ in changes])
+    items = []
+    added = 0
+    for object_id, size in changes:
+        old = current.get(object_id)
+        if size == old:
+            continue
+        key = {'username': username, 'object_key': object_id}
+        # Each write only applies if the charge is still the one read above
+        if old is None:
+            condition = {'ConditionExpression': 'attribute_not_exists(object_key)'}
+        else:
+            condition = {
+                'ConditionExpression': '#size = :old',
+                'ExpressionAttributeNames': {'#size': 'size'},
+                'ExpressionAttributeValues': {':old': old}
+            }
+        if size is None:
+            items.append({'Delete': {'TableName': user_objects_table.name, 'Key': key, **condition}})
+        else:
+            item = {**key, 'size': size}
+            items.append({'Put': {'TableName': user_objects_table.name, 'Item': item, **condition}})
+        added += (size or 0) - (old or 0)
+
+    if counted and (added != reserved or reserved):
+        # ADD would create a missing counter, which would then count as seeded
+        items.append({'Update': {
+            'TableName': users_table.name,
+            'Key': {'username': username},
+            'UpdateExpression': 'ADD used_bytes :used, reserved_bytes :settled',
+            'ConditionExpression': 'attribute_exists(used_bytes)',
+            'ExpressionAttributeValues': {':used': added - reserved, ':settled': -reserved}
+        }})
+    if not items:
+        return added
+    try:
+        users_table.meta.client.transact_write_items(TransactItems=items)
+    except ClientError as e:
+        code = e.response.get('Error', {}).get('Code')
+        reasons = [reason.get('Code') for reason in e.response.get('CancellationReasons', [])]
+        if 'Update' in items[-1] and reasons[-1:] == ['ConditionalCheckFailed']:
+            return UNSEEDED
+        # Another writer got there first: read the charges again and retry
+        if code == 'TransactionConflictException' or (
+            code == 'TransactionCanceledException' and set(reasons) <= RETRY_REASONS
+        ):
+            return None
+        raise
+    return added
+
+def _apply_charges(username, changes, reserved=0):
+    """
+    Writes (object id, size or None) charges and moves used_bytes by the difference.
+
+    Each transaction re-reads the charges it replaces, so charges written from
+    other machines are never counted twice or lost. A reservation is settled
+    in the same transaction as the first batch. Before the counter is seeded
+    only the charges are written; seed_storage totals them up.
+    """
+    added = 0
+    counted = True
+    changes = iter(changes)
+    batch = list(islice(changes, CHARGES_PER_TRANSACTION))
+    while batch or reserved:
+        result = _transact_charges(username, batch, reserved, counted)
+        if result is UNSEEDED:
+            counted = False
+            continue
+        if result is None:
+            continue
+        added += result
+        reserved = 0
+        batch = list(islice(changes, CHARGES_PER_TRANSACTION))
+    return added
+
+def get_object_charge(username, bucket, key):
+    """
+    Reads the bytes a user is charged for one object.
+
+    Args:
+        username (str): The username of the user.
+        bucket (str): The bucket holding the object.
+        key (str): The object's key.
+
+    Returns:
+        int: The charged size (0 if the object is not charged to this user).
+    """
+    return _read_charges(username, [_object_id(bucket, key)]).get(_object_id(bucket, key), 0)
+
+def charge_object(username, bucket, key, size, reserved=0):
+    """
+    Charges an object a user just wrote, replacing any earlier charge for the key.
+
+    Overwriting one of the user's own objects only adds the difference in size.
+
+    Args:
+        username (str): The username of the user.
+        bucket (str): The bucket holding the object.
+        key (str): The object's key.
+        size (int): The object's size in bytes.
+        reserved (int): Bytes reserved for the write with reserve_storage, settled here.
+
+    Returns:
+        int: Change in the user's stored bytes.
+    """
+    return _apply_charges(username, [(_object_id(bucket, key), size)], reserved)
+
+def release_objects(username, bucket, keys):
+    """
+    Gives back the bytes of deleted objects that were charged to a user.
+
+    Args:
+        username (str): The username of the user.
+        bucket (str): The bucket the objects were deleted from.
+        keys (list): The deleted keys; keys never charged to this user are ignored.
+
+    Returns:
+        int: Bytes released.
+    """
+    return -_apply_charges(username, ((_object_id(bucket, key), None) for key in keys))
+
+def move_charges(username, bucket, pairs):
+    """
+    Carries charges over to the keys objects were moved to.
+
+    A charge that was held on a target key is released, since the move overwrote that object.
+
+    Args:
+        username (str): The username of the user.
+        bucket (str): The bucket the objects were moved within.
+        pairs (list): (source key, target key) pairs of finished moves.
+    """
+    pairs = list(pairs)
+    charges = _read_charges(username, [_object_id(bucket, source) for source, _ in pairs])
+
+    def changes():
+        for source, target in pairs:
+            # Source and target stay adjacent, so a batch never splits a move
+            yield _object_id(bucket, source), None
+            yield _object_id(bucket, target), charges.get(_object_id(bucket, source))
+
+    _apply_charges(username, changes())
+
+def move_prefix_charges(username, bucket, source_prefix, target_prefix):
+    """
+    Carries the charges of every key under source_prefix over to target_prefix.
+
+    Args:
+        username (str): The username of the user.
+        bucket (str): The bucket the folder was moved within.
+        source_prefix (str): The folder's old prefix.
+        target_prefix (str): The folder's new prefix.
+    """
+    charged = _object_id(bucket, source_prefix)
+    sources = []
+    query = {
+        'KeyConditionExpression': Key('username').eq(username) & Key('object_key').begins_with(charged),
+        'ProjectionExpression': 'object_key',
+        'ConsistentRead': True
+    }
+    while True:
+        response = user_objects_table.query(**query)
+        sources.extend(item['object_key'][len(bucket) + 1:] for item in response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    move_charges(username, bucket, [(key, target_prefix + key[len(source_prefix):]) for key in sources])
+
+def seed_storage(username, objects):
+    """
+    Backfills the counter of a user whose used_bytes was never set, from the objects they own.
+
+    The owned objects are recorded as charges first, so later deletes and moves
+    give their bytes back. used_bytes is then set to the total of all the user's
+    charges, only if no other machine seeded it first.
+
+    Args:
+        username (str): The username of the user.
+        objects (iterable): (bucket, listed object dict with Key and Size) pairs the user owns.
+
+    Returns:
+        bool: True if this call seeded the counter, False if it was already seeded.
+    """
+    if get_storage_used(username) is not None:
+        return False
+    with user_objects_table.batch_writer(overwrite_by_pkeys=['username', 'object_key']) as batch:
+        for bucket, obj in objects:
+            batch.put_item(Item={
+                'username': username,
+                'object_key': _object_id(bucket, obj['Key']),
+                'size': obj.get('Size', 0)
+            })
+
+    used = 0
+    query = {
+        'KeyConditionExpression': Key('username').eq(username),
+        'ProjectionExpression': '#size',
+        'ExpressionAttributeNames': {'#size': 'size'},
+        'ConsistentRead': True
+    }
+    while True:
+        response = user_objects_table.query(**query)
+        used += sum(int(item['size']) for item in response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    try:
+        users_table.update_item(
+            Key={'username': username},
+            UpdateExpression='SET used_bytes = :used, reserved_bytes = :none',
+            ConditionExpression='attribute_not_exists(used_bytes)',
+            ExpressionAttributeValues={':used': used, ':none': 0}
+        )
+        return True
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+            return False
+        raise
@@ -0,0 +1,258 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+MB = 1024 * 1024
+
+READ_CHUNK = 1 * MB
+# Part sizes S3 clients commonly use, tried when matching multipart ETags
+COMMON_PART_SIZES = [5 * MB, 8 * MB, 16 * MB, 32 * MB, 64 * MB, 100 * MB, 128 * MB, 256 * MB, 512 * MB]
+# Multipart ETags computed alongside MD5/SHA-256 on the first pass over a file
+# (boto3's default part size and the chunk sizes of our transfer profiles)
+DEFAULT_ETAG_PART_SIZES = [8 * MB, 16 * MB, 64 * MB]
+
+# Kept next to s3_file_manager.log
+HASH_CACHE_PATH = 'hash_cache.sqlite'
+# Bytes of database pages the cached digests may take up
+HASH_CACHE_MAX_BYTES = 64 * MB
+
+# One read buffer per thread, reused for every file that thread hashes
+_buffers = threading.local()
+
+
+def normalize_etag(etag):
+    return (etag or '').strip('"').lower()
+
+
+def _read_buffer():
+    buffer = getattr(_buffers, 'buffer', None)
+    if buffer is None:
+        buffer = _buffers.buffer = bytearray(READ_CHUNK)
+    return buffer
+
+
+class _PartHasher:
+    """Accumulates the per-part MD5s of a multipart ETag"""
+
+    def __init__(self, part_size):
+        self.part_size = part_size
+        self.digests = []
+        self.md5 = hashlib.md5()
+        self.filled = 0
+
+    def update(self, view):
+        offset = 0
+        while offset < len(view):
+            take = min(len(view) - offset, self.part_size - self.filled)
+            self.md5.update(view[offset:offset + take])
+            self.filled += take
+            offset += take
+            if self.filled == self.part_size:
+                self.digests.append(self.md5.digest())
+                self.md5 = hashlib.md5()
+                self.filled = 0
+
+    def etag(self, whole_md5):
+        digests = self.digests + ([self.md5.digest()] if self.filled else [])
+        if len(digests) <= 1:
+            return whole_md5
+        return f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+
+
+def hash_file(path, part_sizes=(), sha256=False):
+    """Stream a file once and return (md5, sha256 or None, {part_size: etag})"""
+    md5 = hashlib.md5()
+    sha = hashlib.sha256() if sha256 else None
+    parts = [_PartHasher(size) for size in part_sizes if size]
+    buffer = _read_buffer()
+    view = memoryview(buffer)
+
+    with open(path, 'rb') as file_obj:
+        while True:
+            read = file_obj.readinto(buffer)
+            if not read:
+                break
+            chunk = view[:read]
+            md5.update(chunk)
+            if sha:
+                sha.update(chunk)
+            for part in parts:
+                part.update(chunk)
+
+    whole = md5.hexdigest()
+    etags = {part.part_size: part.etag(whole) for part in parts}
+    return whole, sha.hexdigest() if sha else None, etags
+
+
+def compute_etag(path, part_size=None):
+    """S3 style ETag of a local file.
+
+    Without ``part_size`` (or when the file fits in one part) this is the
+    file's MD5; otherwise it is the MD5 of the part MD5s followed by
+    ``-<part count>``, as S3 computes it for multipart uploads.
+    """
+    whole, _, etags = hash_file(path, [part_size] if part_size else [])
+    return etags.get(part_size, whole)
+
+
+def candidate_part_sizes(file_size, part_count):
+    """Part sizes that split ``file_size`` bytes into exactly ``part_count`` parts"""
+    guesses = list(COMMON_PART_SIZES)
+    # Tools that size parts as file_size / part_count, rounded up to a MB
+    even = -(-file_size // part_count)
+    guesses.append(-(-even // MB) * MB)
+    sizes = []
+    for size in guesses:
+        if size not in sizes and -(-file_size // size) == part_count:
+            sizes.append(size)
+    return sizes
+
+
+def etag_matches(path, file_size, remote_etag, cache=None):
+    """Whether the local file has the same content as an object with ``remote_etag``"""
+    etag_of = cache.etag if cache else compute_etag
+    remote_etag = normalize_etag(remote_etag)
+    if '-' not in remote_etag:
+        return etag_of(path) == remote_etag
+
+    part_count = int(remote_etag.split('-')[1])
+    if part_count == 1:
+        # A one-part multipart upload: the MD5 of the file's MD5, whatever the part size was
+        return f"{hashlib.md5(bytes.fromhex(etag_of(path))).hexdigest()}-1" == remote_etag
+    for part_size in candidate_part_sizes(file_size, part_count):
+        if etag_of(path, part_size) == remote_etag:
+            return True
+    return False
+
+
+class HashCache:
+    """Persistent SQLite cache of file digests.
+
+    Entries are keyed by absolute path and are only trusted while the file's
+    inode, size and mtime_ns are unchanged. The first lookup of a file stores
+    its MD5, SHA-256 and the multipart ETags for DEFAULT_ETAG_PART_SIZES in a
+    single pass; other part sizes are added as they are asked for. The least
+    recently used entries are evicted once the database's pages in use hold
+    more than ``max_bytes``; freed pages are reused, so the file stays near
+    that size.
+    """
+
+    def __init__(self, path=HASH_CACHE_PATH, max_bytes=HASH_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    inode INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    md5 TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS etags (
+                    path TEXT NOT NULL,
+                    part_size INTEGER NOT NULL,
+                    etag TEXT NOT NULL,
+                    PRIMARY KEY (path, part_size)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS files_last_used ON files (last_used)")
+
+    def md5(self, path):
+        return self._lookup(path)['md5']
+
+    def sha256(self, path):
+        return self._lookup(path)['sha256']
+
+    def etag(self, path, part_size=None):
+        entry = self._lookup(path, part_size)
+        if not part_size:
+            return entry['md5']
+        return entry['etags'][part_size]
+
+    def _lookup(self, path, part_size=None):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        entry = self._cached(path, stat)
+
+        if entry is None:
+            part_sizes = set(DEFAULT_ETAG_PART_SIZES)
+            if part_size:
+                part_sizes.add(part_size)
+            md5, sha256, etags = hash_file(path, sorted(part_sizes), sha256=True)
+            entry = {'md5': md5, 'sha256': sha256, 'etags': etags}
+            self._store(path, stat, entry)
+        elif part_size and part_size not in entry['etags']:
+            _, _, etags = hash_file(path, [part_size])
+            entry['etags'].update(etags)
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO etags VALUES (?, ?, ?)",
+                    (path, part_size, etags[part_size])
+                )
+        return entry
+
+    def _cached(self, path, stat):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT inode, size, mtime_ns, md5, sha256 FROM files WHERE path = ?",
+                (path,)
+            ).fetchone()
+            if row is None:
+                return None
+            if tuple(row[:3]) != (stat.st_ino, stat.st_size, stat.st_mtime_ns):
+                return None
+            etags = dict(self._conn.execute(
+                "SELECT part_size, etag FROM etags WHERE path = ?",
+                (path,)
+            ).fetchall())
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE files SET last_used = ? WHERE path = ?",
+                    (time.time(), path)
+                )
+        return {'md5': row[3], 'sha256': row[4], 'etags': etags}
+
+    def _store(self, path, stat, entry):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM etags WHERE path = ?", (path,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, stat.st_ino, stat.st_size, stat.st_mtime_ns,
+                 entry['md5'], entry['sha256'], time.time())
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO etags VALUES (?, ?, ?)",
+                [(path, size, etag) for size, etag in entry['etags'].items()]
+            )
+            self._evict()
+
+    def _used_bytes(self):
+        """Bytes of database pages holding data, not counting free pages"""
+        page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+        page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+        return (page_count - free_pages) * page_size
+
+    def _evict(self):
+        """Drop least recently used entries once the cache is over its size cap"""
+        used = self._used_bytes()
+        if used <= self.max_bytes:
+            return
+        count = self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        # Entries are much alike in size: drop the share over the cap and a tenth more
+        excess = int(count * (1 - self.max_bytes / used)) + count // 10 + 1
+        stale = self._conn.execute(
+            "SELECT path FROM files ORDER BY last_used LIMIT ?",
+            (excess,)
+        ).fetchall()
+        self._conn.executemany("DELETE FROM etags WHERE path = ?", stale)
+        self._conn.executemany("DELETE FROM files WHERE path = ?", stale)
@@ -0,0 +1,400 @@
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from botocore.exceptions import ClientError
+
+from utils.bulk_delete import BulkDeleter
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+# CopyObject refuses sources above 5 GB; those are copied part by part
+MULTIPART_COPY_THRESHOLD = 5 * GB
+COPY_PART_SIZE = 512 * MB
+MAX_PARTS = 10000
+# Slack allowed between our clock and S3's LastModified when matching copies to a move
+CLOCK_SKEW = 5 * 60
+
+# Kept next to s3_file_manager.log, like the upload journal
+JOURNAL_PATH = 'move_journal.sqlite'
+
+MOVE_COPYING = 'copying'
+MOVE_DELETING = 'deleting'
+MOVE_ROLLING_BACK = 'rolling_back'
+
+# States of a journaled (source, target) pair
+ITEM_PLANNED = 'planned'
+ITEM_COPIED = 'copied'
+# Written before the source's DeleteObjects request: the source may or may not be gone
+ITEM_DELETING = 'deleting'
+ITEM_DELETED = 'deleted'
+
+
+class MoveCancelled(Exception):
+    """Raised when a move is cancelled before its sources were deleted"""
+
+
+def target_key(key, source_prefix, target_prefix):
+    """Key of ``key`` once the folder ``source_prefix`` is moved to ``target_prefix``"""
+    return target_prefix + key[len(source_prefix):]
+
+
+class MoveJournal:
+    """SQLite write-ahead journal of folder moves.
+
+    Every (source, target) pair of a move is recorded before the first copy
+    and its state is updated as it is copied and its source deleted. A move
+    stays in the journal until it has finished or been undone, so a move cut
+    short by a crash can be resumed or rolled back on the next launch.
+    """
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS moves (
+                    move_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    bucket TEXT NOT NULL,
+                    source_prefix TEXT NOT NULL,
+                    target_prefix TEXT NOT NULL,
+                    phase TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS move_items (
+                    move_id INTEGER NOT NULL,
+                    source_key TEXT NOT NULL,
+                    target_key TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    state TEXT NOT NULL,
+                    PRIMARY KEY (move_id, source_key)
+                )
+            """)
+
+    def start_move(self, bucket, source_prefix, target_prefix, pairs):
+        """Record a planned move of (source object, target key) pairs; returns its id"""
+        with self._lock, self._conn:
+            move_id = self._conn.execute(
+                "INSERT INTO moves (bucket, source_prefix, target_prefix, phase, created_at) VALUES (?, ?, ?, ?, ?)",
+                (bucket, source_prefix, target_prefix, MOVE_COPYING, time.time())
+            ).lastrowid
+            self._conn.executemany(
+                "INSERT INTO move_items VALUES (?, ?, ?, ?, ?)",
+                [(move_id, obj['Key'], new_key, obj.get('Size', 0), ITEM_PLANNED) for obj, new_key in pairs]
+            )
+        return move_id
+
+    def set_phase(self, move_id, phase):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE moves SET phase = ? WHERE move_id = ?", (phase, move_id))
+
+    def mark(self, move_id, source_keys, state):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE move_items SET state = ? WHERE move_id = ? AND source_key = ?",
+                [(state, move_id, key) for key in source_keys]
+            )
+
+    def pending_moves(self):
+        """Moves that were interrupted, as dicts with a count of items per state"""
+        with self._lock:
+            moves = self._conn.execute(
+                "SELECT move_id, bucket, source_prefix, target_prefix, phase, created_at FROM moves ORDER BY move_id"
+            ).fetchall()
+            result = []
+            for move_id, bucket, source_prefix, target_prefix, phase, created_at in moves:
+                counts = dict(self._conn.execute(
+                    "SELECT state, COUNT(*) FROM move_items WHERE move_id = ? GROUP BY state",
+                    (move_id,)
+                ).fetchall())
+                result.append({
+                    'move_id': move_id,
+                    'bucket': bucket,
+                    'source_prefix': source_prefix,
+                    'target_prefix': target_prefix,
+                    'phase': phase,
+                    'created_at': created_at,
+                    'counts': counts
+                })
+        return result
+
+    def items(self, move_id, state):
+        """(source object dict, target key) pairs of a move in the given state"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT source_key, target_key, size FROM move_items WHERE move_id = ? AND state = ?",
+                (move_id, state)
+            ).fetchall()
+        return [({'Key': source_key, 'Size': size}, new_key) for source_key, new_key, size in rows]
+
+    def finish_move(self, move_id):
+        """Forget a move once it has completed or been undone"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM move_items WHERE move_id = ?", (move_id,))
+            self._conn.execute("DELETE FROM moves WHERE move_id = ?", (move_id,))
+
+
+class FolderMover:
+    """Moves every object under a prefix with concurrent server-side copies.
+
+    Objects up to 5 GB are copied with CopyObject, larger ones with a
+    multipart upload of ``upload_part_copy`` ranges. The sources are only
+    deleted, in 1000-key DeleteObjects batches, once every copy has
+    succeeded. A move that fails or is cancelled during the copy phase
+    deletes the copies it made, leaving the source folder as it was.
+
+    With a ``journal`` each move is recorded before it starts, and ``resume``
+    or ``roll_back`` can later finish or undo a move that was interrupted.
+    """
+
+    def __init__(self, s3_client, max_concurrency=8, journal=None, on_copied=None, on_deleted=None):
+        self.s3_client = s3_client
+        self.max_concurrency = max_concurrency
+        self.journal = journal
+        # Called with (bucket, [{'Key', 'Size'}, ...]) for targets written and keys deleted
+        self.on_copied = on_copied
+        self.on_deleted = on_deleted
+
+    def move(self, bucket_name, objects, source_prefix, target_prefix, callback=None, cancel_event=None):
+        """Move listed ``objects`` from source_prefix to target_prefix; returns the number moved
+
+        ``callback(phase, done, total)`` is called as copies and deletes finish.
+        """
+        pairs = [(obj, target_key(obj['Key'], source_prefix, target_prefix)) for obj in objects]
+        move_id = None
+        if self.journal:
+            move_id = self.journal.start_move(bucket_name, source_prefix, target_prefix, pairs)
+
+        copied, error = self.copy_all(bucket_name, pairs, callback, cancel_event, move_id)
+        if error:
+            # Nothing has been deleted yet; drop the copies so the tree is as before
+            self.delete_targets(bucket_name, copied, move_id)
+            self.finish(move_id)
+            if isinstance(error, MoveCancelled):
+                raise error
+            raise Exception(f"Failed to move folder: {str(error)}")
+
+        self.delete_sources(bucket_name, copied, callback, move_id)
+        self.finish(move_id)
+        return len(copied)
+
+    def resume(self, move, callback=None):
+        """Finish an interrupted move (a ``journal.pending_moves()`` entry); returns the number moved"""
+        bucket_name, move_id = move['bucket'], move['move_id']
+        self.journal.set_phase(move_id, MOVE_COPYING)
+        _, error = self.copy_all(bucket_name, self.journal.items(move_id, ITEM_PLANNED), callback, None, move_id)
+        if error:
+            raise Exception(f"Failed to resume move: {str(error)}")
+
+        # Deleting a source that is already gone succeeds, so half-done deletes are simply redone
+        copied = self.journal.items(move_id, ITEM_COPIED) + self.journal.items(move_id, ITEM_DELETING)
+        self.delete_sources(bucket_name, copied, callback, move_id)
+        self.finish(move_id)
+        return len(copied)
+
+    def roll_back(self, move, callback=None):
+        """Undo an interrupted move, putting back any originals it had already removed"""
+        bucket_name, move_id = move['bucket'], move['move_id']
+        self.journal.set_phase(move_id, MOVE_ROLLING_BACK)
+
+        # A crash during DeleteObjects leaves items whose source may be gone; check each one
+        deleted = self.journal.items(move_id, ITEM_DELETED)
+        for obj, new_key in self.journal.items(move_id, ITEM_DELETING):
+            if self.exists(bucket_name, obj['Key']):
+                self.journal.mark(move_id, [obj['Key']], ITEM_COPIED)
+            else:
+                deleted.append((obj, new_key))
+
+        # Originals that are gone are copied back from their targets first
+        restore = [({'Key': new_key, 'Size': obj['Size']}, obj['Key']) for obj, new_key in deleted]
+        _, error = self.copy_all(bucket_name, restore, callback)
+        if error:
+            raise Exception(f"Failed to roll back move: {str(error)}")
+        self.journal.mark(move_id, [obj['Key'] for obj, _ in deleted], ITEM_COPIED)
+
+        # A crash can land between a finished CopyObject and its journal entry, so
+        # planned pairs whose target is already a copy of the source are removed too
+        planned = self.journal.items(move_id, ITEM_PLANNED)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='s3-move') as executor:
+            matches = list(executor.map(
+                lambda pair: self.is_copy(bucket_name, pair[0], pair[1], move['created_at']),
+                planned
+            ))
+        copied = [pair for pair, match in zip(planned, matches) if match]
+
+        # Every copied pair has its original again, so its target can go
+        self.delete_targets(bucket_name, self.journal.items(move_id, ITEM_COPIED) + copied, move_id)
+        self.finish(move_id)
+
+    def copy_all(self, bucket_name, pairs, callback=None, cancel_event=None, move_id=None):
+        """Copy (source object, target key) pairs; returns (pairs copied, first error or None)"""
+        total = len(pairs)
+        copied = []
+        lock = threading.Lock()
+
+        def copy(pair):
+            obj, new_key = pair
+            self.copy(bucket_name, obj['Key'], new_key, obj.get('Size', 0), cancel_event)
+            if move_id is not None:
+                self.journal.mark(move_id, [obj['Key']], ITEM_COPIED)
+            if self.on_copied:
+                self.on_copied(bucket_name, [{'Key': new_key, 'Size': obj.get('Size', 0)}])
+            with lock:
+                copied.append(pair)
+                if callback:
+                    callback(MOVE_COPYING, len(copied), total)
+
+        error = None
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='s3-move') as executor:
+            pending = set()
+            for pair in pairs:
+                if cancel_event is not None and cancel_event.is_set():
+                    error = MoveCancelled("Move cancelled")
+                    break
+                if len(pending) >= self.max_concurrency * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    error = next((future.exception() for future in done if future.exception()), None)
+                    if error:
+                        break
+                pending.add(executor.submit(copy, pair))
+            for future in wait(pending).done:
+                error = error or future.exception()
+        return copied, error
+
+    def delete_sources(self, bucket_name, pairs, callback=None, move_id=None):
+        total = len(pairs)
+        if move_id is not None:
+            self.journal.set_phase(move_id, MOVE_DELETING)
+
+        def deleting(bucket, objects):
+            if move_id is not None:
+                self.journal.mark(move_id, [obj['Key'] for obj in objects], ITEM_DELETING)
+
+        def deleted(bucket, objects):
+            if move_id is not None:
+                self.journal.mark(move_id, [obj['Key'] for obj in objects], ITEM_DELETED)
+            if self.on_deleted:
+                self.on_deleted(bucket, objects)
+
+        def progress(count, failed):
+            if callback:
+                callback(MOVE_DELETING, count, total)
+
+        deleter = BulkDeleter(self.s3_client, self.max_concurrency, on_deleted=deleted, on_deleting=deleting)
+        _, errors = deleter.delete(bucket_name, [obj for obj, _ in pairs], progress)
+        if errors:
+            raise Exception(
+                f"Copied everything but failed to delete {len(errors)} source object(s), first: {errors[0].get('Key')}"
+            )
+
+    def delete_targets(self, bucket_name, pairs, move_id=None):
+        """Delete the copies of pairs whose sources are still in place"""
+        if move_id is not None:
+            self.journal.set_phase(move_id, MOVE_ROLLING_BACK)
+        sources = {new_key: obj['Key'] for obj, new_key in pairs}
+
+        def deleted(bucket, objects):
+            if move_id is not None:
+                self.journal.mark(move_id, [sources[obj['Key']] for obj in objects], ITEM_PLANNED)
+            if self.on_deleted:
+                self.on_deleted(bucket, objects)
+
+        deleter = BulkDeleter(self.s3_client, self.max_concurrency, on_deleted=deleted)
+        targets = [{'Key': new_key, 'Size': obj.get('Size', 0)} for obj, new_key in pairs]
+        _, errors = deleter.delete(bucket_name, targets)
+        if errors:
+            raise Exception(f"Failed to remove {len(errors)} copied object(s), first: {errors[0].get('Key')}")
+
+    def finish(self, move_id):
+        if move_id is not None:
+            self.journal.finish_move(move_id)
+
+    def head(self, bucket_name, key):
+        """head_object response for key, or None if it does not exist"""
+        try:
+            return self.s3_client.head_object(Bucket=bucket_name, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def exists(self, bucket_name, key):
+        return self.head(bucket_name, key) is not None
+
+    def is_copy(self, bucket_name, obj, new_key, started):
+        """True when new_key holds a finished copy of the source obj"""
+        target = self.head(bucket_name, new_key)
+        if target is None or target['ContentLength'] != obj.get('Size', 0):
+            return False
+        if obj.get('Size', 0) > MULTIPART_COPY_THRESHOLD:
+            # Part by part copies get an ETag of their own; one written since the move began is ours
+            return target['LastModified'].timestamp() >= started - CLOCK_SKEW
+        source = self.head(bucket_name, obj['Key'])
+        return source is not None and source['ETag'] == target['ETag']
+
+    def copy(self, bucket_name, source_key, new_key, size, cancel_event=None):
+        copy_source = {'Bucket': bucket_name, 'Key': source_key}
+        if size <= MULTIPART_COPY_THRESHOLD:
+            self.s3_client.copy_object(CopySource=copy_source, Bucket=bucket_name, Key=new_key)
+            return
+
+        # Multipart uploads do not carry the source's headers over on their own
+        head = self.s3_client.head_object(Bucket=bucket_name, Key=source_key)
+        extra = {'Metadata': head.get('Metadata', {})}
+        for header in ('ContentType', 'ContentEncoding', 'ContentDisposition', 'CacheControl'):
+            if head.get(header):
+                extra[header] = head[header]
+        upload_id = self.s3_client.create_multipart_upload(Bucket=bucket_name, Key=new_key, **extra)['UploadId']
+
+        part_size = max(COPY_PART_SIZE, -(-size // MAX_PARTS))
+
+        def copy_part(number, start):
+            end = min(start + part_size, size) - 1
+            response = self.s3_client.upload_part_copy(
+                Bucket=bucket_name,
+                Key=new_key,
+                UploadId=upload_id,
+                PartNumber=number,
+                CopySource=copy_source,
+                CopySourceRange=f"bytes={start}-{end}",
+                CopySourceIfMatch=head['ETag']
+            )
+            return {'PartNumber': number, 'ETag': response['CopyPartResult']['ETag']}
+
+        try:
+            parts = []
+            # Its own pool: parts queued behind the copy workers waiting on them would never run
+            with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='s3-copy-part') as executor:
+                pending = set()
+                try:
+                    for number, start in enumerate(range(0, size, part_size), 1):
+                        if cancel_event is not None and cancel_event.is_set():
+                            raise MoveCancelled("Move cancelled")
+                        if len(pending) >= self.max_concurrency * 2:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            parts.extend(future.result() for future in done)
+                        pending.add(executor.submit(copy_part, number, start))
+                    done, pending = wait(pending)
+                    parts.extend(future.result() for future in done)
+                finally:
+                    # Parts not started yet are dropped; the ones running finish before the abort
+                    for future in pending:
+                        future.cancel()
+            if cancel_event is not None and cancel_event.is_set():
+                raise MoveCancelled("Move cancelled")
+
+            self.s3_client.complete_multipart_upload(
+                Bucket=bucket_name,
+                Key=new_key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': sorted(parts, key=lambda part: part['PartNumber'])}
+            )
+        except Exception:
+            self.s3_client.abort_multipart_upload(Bucket=bucket_name, Key=new_key, UploadId=upload_id)
+            raise
@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 30.0
+# Folders + objects held across all cached listings
+DEFAULT_MAX_ROWS = 200000
+
+
+def parent_prefixes(key):
+    """Every folder listing a key shows up in: '', 'a/', 'a/b/' for 'a/b/c.txt'"""
+    prefixes = ['']
+    index = key.find('/')
+    while index != -1:
+        prefixes.append(key[:index + 1])
+        index = key.find('/', index + 1)
+    return prefixes
+
+
+class ListingCache:
+    """In-process cache of folder listings keyed by (bucket, prefix).
+
+    Entries expire after ``ttl`` seconds, and the least recently used ones are
+    evicted once the cached listings hold more than ``max_rows`` folders and
+    objects in total. Changes made through this app invalidate the listings
+    they affect: a key invalidates every folder it is listed under, a folder
+    that was removed or moved also invalidates everything below it.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_rows=DEFAULT_MAX_ROWS):
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._entries = OrderedDict()  # (bucket, prefix) -> (expires_at, rows, pages)
+        self._rows = 0
+        self._lock = threading.Lock()
+
+    def get(self, bucket_name, prefix):
+        """Cached list of (folders, objects) pages, or None"""
+        key = (bucket_name, prefix)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def put(self, bucket_name, prefix, pages):
+        rows = sum(len(folders) + len(objects) for folders, objects in pages)
+        if rows > self.max_rows:
+            return
+        key = (bucket_name, prefix)
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, rows, pages)
+            self._rows += rows
+            while self._rows > self.max_rows:
+                self._pop(next(iter(self._entries)))
+
+    def add_object(self, bucket_name, obj):
+        """Fold a key this app has just written into the cached listings it shows up in.
+
+        The object goes into its folder's listing and, when its sub-folder is
+        new, the sub-folder into each listing above it, so the next refresh of
+        those folders needs no LIST call.
+        """
+        key = obj['Key']
+        with self._lock:
+            for prefix in parent_prefixes(key):
+                entry = self._entries.get((bucket_name, prefix))
+                if entry is None:
+                    continue
+                expires_at, rows, pages = entry
+                child = key[len(prefix):]
+                slash = child.find('/')
+                if slash == -1:
+                    pages, added = self._with_object(pages, obj)
+                else:
+                    pages, added = self._with_folder(pages, prefix + child[:slash + 1])
+                self._entries[(bucket_name, prefix)] = (expires_at, rows + added, pages)
+                self._rows += added
+
+    @staticmethod
+    def _with_object(pages, obj):
+        """Copy of pages with obj added or replaced; returns (pages, rows added)"""
+        pages = list(pages)
+        for index, (folders, objects) in enumerate(pages):
+            for position, cached in enumerate(objects):
+                if cached['Key'] == obj['Key']:
+                    objects = list(objects)
+                    objects[position] = obj
+                    pages[index] = (folders, objects)
+                    return pages, 0
+        folders, objects = pages[-1] if pages else ([], [])
+        pages[-1:] = [(folders, objects + [obj])]
+        return pages, 1
+
+    @staticmethod
+    def _with_folder(pages, folder):
+        """Copy of pages with the folder prefix added if missing; returns (pages, rows added)"""
+        if any(folder in folders for folders, _ in pages):
+            return pages, 0
+        pages = list(pages)
+        folders, objects = pages[-1] if pages else ([], [])
+        pages[-1:] = [(folders + [folder], objects)]
+        return pages, 1
+
+    def invalidate(self, bucket_name, key):
+        """Forget the listings an added or removed key appears in"""
+        with self._lock:
+            for prefix in parent_prefixes(key):
+                self._pop((bucket_name, prefix))
+
+    def invalidate_keys(self, bucket_name, keys):
+        prefixes = set()
+        for key in keys:
+            prefixes.update(parent_prefixes(key))
+        with self._lock:
+            for prefix in prefixes:
+                self._pop((bucket_name, prefix))
+
+    def invalidate_tree(self, bucket_name, prefix):
+        """Forget the listings of a folder, its sub-folders and its parents"""
+        with self._lock:
+            for parent in parent_prefixes(prefix):
+                self._pop((bucket_name, parent))
+            below = [
+                key for key in self._entries
+                if key[0] == bucket_name and key[1].startswith(prefix)
+            ]
+            for key in below:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._rows = 0
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._rows -= entry[1]
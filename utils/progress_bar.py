@@ -32,7 +32,14 @@ class ModernProgressBar(ttk.Frame):
         self.text_color = kwargs.pop('text_color', '#FFFFFF')
         
         # Draw initial state
+        self._create_gradient_image()
         self._draw_border()
+        self.canvas.create_text(
+            self.width / 2, self.height / 2,
+            fill=self.text_color,
+            font=('Helvetica', 8, 'bold'),
+            tags='text'
+        )
         self._draw_progress()
         
     def _create_gradient(self, width):
@@ -49,6 +56,30 @@ class ModernProgressBar(ttk.Frame):
             gradient.append(f'#{r:02x}{g:02x}{b:02x}')
         return gradient
     
+    def _create_gradient_image(self):
+        """Render the gradient once as an image item, with a cover hiding the part not reached yet"""
+        width = max(self.width - 2 * self.border_width, 1)
+        height = max(self.height - 2 * self.border_width, 1)
+        self._gradient_image = tk.PhotoImage(master=self.canvas, width=width, height=height)
+        # One row of pixels, repeated down the whole image by Tk
+        row = '{' + ' '.join(self._create_gradient(width)) + '}'
+        self._gradient_image.put(row, to=(0, 0, width, height))
+        self.canvas.create_image(
+            self.border_width, self.border_width,
+            image=self._gradient_image,
+            anchor='nw',
+            tags='progress'
+        )
+
+        # Progress only moves the left edge of this cover
+        self.canvas.create_rectangle(
+            self.border_width, self.border_width,
+            self.width - self.border_width, self.height - self.border_width,
+            fill=self.canvas.cget('bg'),
+            outline='',
+            tags='cover'
+        )
+
     def _hex_to_rgb(self, hex_color):
         """Convert hex color to RGB values"""
         hex_color = hex_color.lstrip('#')
@@ -61,50 +92,25 @@ class ModernProgressBar(ttk.Frame):
         x1 = self.width - self.border_width
         y1 = self.height - self.border_width
         
-        # Draw rounded rectangle border
+        # Draw rounded rectangle border, over the gradient and its cover
         self.canvas.create_rounded_rectangle(
             x0, y0, x1, y1,
             radius=self.border_radius,
+            fill='',
             outline='#303030',  # Subtle border color
             width=self.border_width,
             tags='border'
         )
     
     def _draw_progress(self):
-        """Draw the progress bar with gradient effect"""
-        self.canvas.delete('progress', 'text')
-        
-        # Calculate progress width
+        """Reveal the gradient up to the current progress by moving its cover, and update the text"""
         progress_width = int((self.width - 2 * self.border_width) * self._progress / 100)
-        
-        if progress_width > 0:
-            # Create gradient for current progress width
-            gradient = self._create_gradient(progress_width)
-            
-            # Draw gradient rectangles
-            for i in range(progress_width):
-                x0 = i + self.border_width
-                y0 = self.border_width
-                x1 = x0 + 1
-                y1 = self.height - self.border_width
-                
-                self.canvas.create_line(
-                    x0, y0, x0, y1,
-                    fill=gradient[i],
-                    width=1,
-                    tags='progress'
-                )
-        
-        # Draw loading text
-        text_x = self.width / 2
-        text_y = self.height / 2
-        self.canvas.create_text(
-            text_x, text_y,
-            text=f"{self.loading_text} {int(self._progress)}%",
-            fill=self.text_color,
-            font=('Helvetica', 8, 'bold'),
-            tags='text'
+        self.canvas.coords(
+            'cover',
+            self.border_width + progress_width, self.border_width,
+            self.width - self.border_width, self.height - self.border_width
         )
+        self.canvas.itemconfig('text', text=f"{self.loading_text} {int(self._progress)}%")
     
     def set(self, value):
         """Set progress value (0-100)"""
@@ -0,0 +1,282 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+
+MB = 1024 * 1024
+
+READ_CHUNK = 1 * MB
+PART_SUFFIX = '.part'
+STATE_SUFFIX = '.part.json'
+# Finished ranges are appended here, one line each, and folded into the sidecar on resume
+DONE_SUFFIX = '.part.log'
+_MD5_ETAG = re.compile(r'^[0-9a-f]{32}(-\d+)?$')
+
+
+class DownloadVerificationError(Exception):
+    """Raised when a finished download does not match the object in S3"""
+
+
+# Range threads share one fd, so the fallback's seek and write must not interleave
+_SEEK_LOCK = threading.Lock()
+
+
+def pwrite(fd, data, offset):
+    """os.pwrite, with a locked seek+write fallback where it is unavailable (Windows)"""
+    if hasattr(os, 'pwrite'):
+        return os.pwrite(fd, data, offset)
+    with _SEEK_LOCK:
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.write(fd, data)
+
+
+def preallocate(fd, size):
+    """Reserve ``size`` bytes so ranges can be written in place in any order"""
+    if hasattr(os, 'posix_fallocate') and size:
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:
+            pass  # Not supported by every filesystem
+    os.ftruncate(fd, size)
+
+
+def plain_etag(etag):
+    """ETag without quotes, or None when it is not an MD5 based ETag (e.g. SSE-KMS)"""
+    etag = (etag or '').strip('"').lower()
+    return etag if _MD5_ETAG.match(etag) else None
+
+
+class RangedDownloader:
+    """Downloads an object as concurrent byte ranges written in place.
+
+    For multipart objects the ranges follow the object's own part boundaries,
+    which lets the multipart ETag be checked from per-range MD5s computed while
+    downloading. Single part objects are verified by hashing the finished file.
+
+    Data goes to ``<local_path>.part``. The planned ranges and the source ETag
+    are kept in a ``<local_path>.part.json`` sidecar, and each finished range
+    is appended to ``<local_path>.part.log`` so recording it costs one short
+    write however many ranges there are. A later
+    download to the same path fetches only the missing ranges, unless the
+    object has changed in the meantime, and the file is renamed into place
+    once it has been verified.
+    """
+
+    def __init__(self, s3_client, range_size=16 * MB, max_concurrency=8):
+        self.s3_client = s3_client
+        self.range_size = range_size
+        self.max_concurrency = max_concurrency
+
+    def download(self, bucket_name, key, local_path, callback=None, head=None):
+        """Download ``key`` to ``local_path``; ``head`` may be a prior head_object response"""
+        head = head or self.s3_client.head_object(Bucket=bucket_name, Key=key)
+        file_size = head['ContentLength']
+        etag = head['ETag']
+        part_path = local_path + PART_SUFFIX
+        state_path = local_path + STATE_SUFFIX
+        done_path = local_path + DONE_SUFFIX
+
+        state = self.load_state(state_path, done_path, part_path, file_size, etag)
+        flags = os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0)
+        if state is None:
+            state = {
+                'etag': etag,
+                'size': file_size,
+                'ranges': self.plan_ranges(bucket_name, key, file_size, etag),
+                'done': {}
+            }
+            flags |= os.O_TRUNC
+
+        ranges = [tuple(byte_range) for byte_range in state['ranges']]
+        missing = [(start, end) for start, end in ranges if str(start) not in state['done']]
+        if callback:
+            resumed = sum(end - start + 1 for start, end in ranges if str(start) in state['done'])
+            if resumed:
+                callback(resumed)
+
+        lock = threading.Lock()
+        done_log = None
+
+        def range_done(start, digest):
+            with lock:
+                state['done'][str(start)] = digest.hex()
+                done_log.write(f"{start} {digest.hex()}\n")
+                done_log.flush()
+
+        fd = os.open(part_path, flags, 0o644)
+        try:
+            if flags & os.O_TRUNC:
+                preallocate(fd, file_size)
+                self.save_state(state_path, state)
+            done_log = open(done_path, 'a')
+            self.fetch_ranges(fd, bucket_name, key, etag, missing, callback, on_range_done=range_done)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+            if done_log:
+                done_log.close()
+
+        digests = {int(start): bytes.fromhex(digest) for start, digest in state['done'].items()}
+        try:
+            self.verify(part_path, file_size, etag, ranges, digests)
+        except DownloadVerificationError:
+            self.discard(part_path, state_path, done_path)
+            raise
+
+        os.replace(part_path, local_path)
+        self.discard(state_path, done_path)
+        return head
+
+    def load_state(self, state_path, done_path, part_path, file_size, etag):
+        """Sidecar state of a resumable partial download, or None to start over"""
+        try:
+            with open(state_path, 'r') as state_file:
+                state = json.load(state_file)
+        except (OSError, ValueError):
+            self.discard(part_path, state_path, done_path)
+            return None
+
+        same_object = state.get('etag') == etag and state.get('size') == file_size
+        part_ok = os.path.exists(part_path) and os.path.getsize(part_path) == file_size
+        if not (same_object and part_ok):
+            # Never stitch ranges of two different object versions together
+            self.discard(part_path, state_path, done_path)
+            return None
+
+        # Fold the ranges logged since the sidecar was last written into it
+        try:
+            with open(done_path, 'r') as done_log:
+                for line in done_log:
+                    fields = line.split()
+                    # A line cut short by a crash is skipped; that range is fetched again
+                    if len(fields) == 2 and len(fields[1]) == 32:
+                        state['done'][fields[0]] = fields[1]
+        except FileNotFoundError:
+            return state
+        self.save_state(state_path, state)
+        os.remove(done_path)
+        return state
+
+    def save_state(self, state_path, state):
+        temp_path = state_path + '.tmp'
+        with open(temp_path, 'w') as state_file:
+            json.dump(state, state_file)
+        os.replace(temp_path, state_path)
+
+    @staticmethod
+    def discard(*paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def plan_ranges(self, bucket_name, key, file_size, etag):
+        """List of (start, end) inclusive byte ranges covering the object"""
+        if file_size == 0:
+            return []
+
+        range_size = self.range_size
+        etag = plain_etag(etag)
+        if etag and '-' in etag:
+            # Align ranges with the uploaded parts so each range has its own MD5
+            part = self.s3_client.head_object(Bucket=bucket_name, Key=key, PartNumber=1)
+            range_size = part['ContentLength']
+
+        return [
+            (start, min(start + range_size, file_size) - 1)
+            for start in range(0, file_size, range_size)
+        ]
+
+    def fetch_ranges(self, fd, bucket_name, key, etag, ranges, callback=None, on_range_done=None):
+        """Fetch ``ranges`` concurrently into ``fd``; returns {start: md5 digest}
+
+        ``on_range_done(start, digest)`` is called as soon as each range is written.
+        """
+        digests = {}
+        if not ranges:
+            return digests
+
+        lock = threading.Lock()
+
+        def fetch(byte_range):
+            start, end = byte_range
+            response = self.s3_client.get_object(
+                Bucket=bucket_name,
+                Key=key,
+                Range=f"bytes={start}-{end}",
+                IfMatch=etag
+            )
+            body = response['Body']
+            md5 = hashlib.md5()
+            offset = start
+            try:
+                while True:
+                    data = body.read(READ_CHUNK)
+                    if not data:
+                        break
+                    pwrite(fd, data, offset)
+                    md5.update(data)
+                    offset += len(data)
+                    if callback:
+                        callback(len(data))
+            finally:
+                body.close()
+            if offset != end + 1:
+                raise DownloadVerificationError(f"Range {start}-{end} ended early at byte {offset}")
+            with lock:
+                digests[start] = md5.digest()
+            if on_range_done:
+                on_range_done(start, digests[start])
+
+        workers = max(1, min(self.max_concurrency, len(ranges)))
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='download-range')
+        try:
+            futures = [executor.submit(fetch, byte_range) for byte_range in ranges]
+            finished, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in futures:
+                future.cancel()
+            for future in finished:
+                if future.exception():
+                    raise future.exception()
+        finally:
+            executor.shutdown(wait=True)
+        return digests
+
+    def verify(self, local_path, file_size, etag, ranges, digests):
+        actual_size = os.path.getsize(local_path)
+        if actual_size != file_size:
+            raise DownloadVerificationError(
+                f"Downloaded size {actual_size} does not match object size {file_size}"
+            )
+
+        expected = plain_etag(etag)
+        if not expected:
+            return
+
+        if '-' in expected:
+            if int(expected.split('-')[1]) != len(ranges):
+                return  # Parts were not uniformly sized, only the size can be checked
+            combined = b''.join(digests[start] for start, _ in ranges)
+            actual = f"{hashlib.md5(combined).hexdigest()}-{len(ranges)}"
+        elif len(ranges) == 1:
+            actual = digests[0].hex()
+        else:
+            md5 = hashlib.md5()
+            buffer = bytearray(READ_CHUNK)
+            view = memoryview(buffer)
+            with open(local_path, 'rb') as file_obj:
+                while True:
+                    read = file_obj.readinto(buffer)
+                    if not read:
+                        break
+                    md5.update(view[:read])
+            actual = md5.hexdigest()
+
+        if actual != expected:
+            raise DownloadVerificationError(
+                f"Downloaded file ETag {actual} does not match object ETag {expected}"
+            )
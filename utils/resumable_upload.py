@@ -0,0 +1,269 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+
+MB = 1024 * 1024
+
+# Files at or above this size are uploaded part by part and can be resumed
+RESUMABLE_THRESHOLD = 100 * MB
+# Kept next to s3_file_manager.log
+JOURNAL_PATH = 'upload_journal.sqlite'
+
+MAX_PARTS = 10000
+MIN_PART_SIZE = 5 * MB
+# Upper bound on part data held in memory at once, across every upload in the process
+MAX_BUFFERED_BYTES = 256 * MB
+
+
+class UploadJournal:
+    """SQLite checkpoint journal of in-progress multipart uploads"""
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS uploads (
+                    bucket TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    local_path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    part_size INTEGER NOT NULL,
+                    upload_id TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (bucket, key)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS parts (
+                    upload_id TEXT NOT NULL,
+                    part_number INTEGER NOT NULL,
+                    etag TEXT NOT NULL,
+                    PRIMARY KEY (upload_id, part_number)
+                )
+            """)
+
+    def find_upload(self, bucket, key, local_path, size, mtime_ns):
+        """Return (upload_id, part_size) of a resumable upload of this exact file"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT upload_id, part_size FROM uploads WHERE bucket = ? AND key = ? "
+                "AND local_path = ? AND size = ? AND mtime_ns = ?",
+                (bucket, key, local_path, size, mtime_ns)
+            ).fetchone()
+        return row
+
+    def stale_upload_id(self, bucket, key):
+        """Upload id journaled for this key, whatever file it was for"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT upload_id FROM uploads WHERE bucket = ? AND key = ?",
+                (bucket, key)
+            ).fetchone()
+        return row[0] if row else None
+
+    def start_upload(self, bucket, key, local_path, size, mtime_ns, part_size, upload_id):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (bucket, key, local_path, size, mtime_ns, part_size, upload_id, time.time())
+            )
+
+    def completed_parts(self, upload_id):
+        """Map of part number -> ETag for the parts already uploaded"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT part_number, etag FROM parts WHERE upload_id = ?",
+                (upload_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def record_part(self, upload_id, part_number, etag):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO parts VALUES (?, ?, ?)",
+                (upload_id, part_number, etag)
+            )
+
+    def finish_upload(self, upload_id):
+        """Forget an upload once it has been completed or aborted"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM parts WHERE upload_id = ?", (upload_id,))
+            self._conn.execute("DELETE FROM uploads WHERE upload_id = ?", (upload_id,))
+
+
+class BufferBudget:
+    """Bytes of part data that uploads running at the same time may hold in memory together"""
+
+    def __init__(self, limit=MAX_BUFFERED_BYTES):
+        self.limit = limit
+        self._used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, size):
+        """Wait until size bytes fit in the budget; returns the amount to release later"""
+        # A part larger than the whole budget waits until it has the budget to itself
+        size = min(size, self.limit)
+        with self._cond:
+            while self._used + size > self.limit:
+                self._cond.wait()
+            self._used += size
+        return size
+
+    def release(self, size):
+        with self._cond:
+            self._used -= size
+            self._cond.notify_all()
+
+
+# Shared by every ResumableUploader, so pool workers uploading several large files stay within it
+SHARED_BUFFER = BufferBudget()
+
+
+def choose_part_size(file_size, part_size):
+    """Grow ``part_size`` until the file fits in S3's 10,000 part limit"""
+    part_size = max(part_size, MIN_PART_SIZE)
+    while part_size * MAX_PARTS < file_size:
+        part_size *= 2
+    return part_size
+
+
+class ResumableUploader:
+    """Explicit multipart upload that checkpoints every finished part.
+
+    If the upload fails or is cancelled (a callback raising), the parts that
+    made it are kept in the journal and the multipart upload is left open, so
+    uploading the same unchanged file to the same key again only sends the
+    missing parts.
+    """
+
+    def __init__(self, s3_client, journal, part_size=64 * MB, max_concurrency=8, buffer=None):
+        self.s3_client = s3_client
+        self.journal = journal
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self.buffer = buffer or SHARED_BUFFER
+
+    def upload(self, local_path, bucket_name, key, callback=None):
+        local_path = os.path.abspath(local_path)
+        stat = os.stat(local_path)
+        file_size = stat.st_size
+
+        upload_id, part_size, done_parts = self._resume_or_start(
+            local_path, bucket_name, key, file_size, stat.st_mtime_ns
+        )
+
+        part_count = max(1, -(-file_size // part_size))
+        # Credit the bytes that were already uploaded by an earlier attempt
+        if callback:
+            for part_number in done_parts:
+                callback(self._part_length(part_number, part_size, file_size))
+
+        missing = [n for n in range(1, part_count + 1) if n not in done_parts]
+        concurrency = max(1, min(self.max_concurrency, MAX_BUFFERED_BYTES // part_size))
+
+        if missing:
+            executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='upload-part')
+            try:
+                futures = [
+                    executor.submit(
+                        self._upload_part, local_path, bucket_name, key, upload_id,
+                        part_number, part_size, file_size, callback
+                    )
+                    for part_number in missing
+                ]
+                finished, _ = wait(futures, return_when=FIRST_EXCEPTION)
+                for future in futures:
+                    future.cancel()
+                for future in finished:
+                    if future.exception():
+                        raise future.exception()
+                for future in futures:
+                    part_number, etag = future.result()
+                    done_parts[part_number] = etag
+            finally:
+                executor.shutdown(wait=True)
+
+        self.s3_client.complete_multipart_upload(
+            Bucket=bucket_name,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={
+                'Parts': [
+                    {'PartNumber': n, 'ETag': done_parts[n]}
+                    for n in sorted(done_parts)
+                ]
+            }
+        )
+        self.journal.finish_upload(upload_id)
+
+    def _resume_or_start(self, local_path, bucket_name, key, file_size, mtime_ns):
+        existing = self.journal.find_upload(bucket_name, key, local_path, file_size, mtime_ns)
+        if existing:
+            upload_id, part_size = existing
+            try:
+                # S3 is authoritative about which parts it still holds
+                done_parts = self._list_parts(bucket_name, key, upload_id)
+                journaled = self.journal.completed_parts(upload_id)
+                done_parts = {n: etag for n, etag in done_parts.items() if journaled.get(n, etag) == etag}
+                return upload_id, part_size, done_parts
+            except self.s3_client.exceptions.NoSuchUpload:
+                self.journal.finish_upload(upload_id)
+
+        # A different version of the file was being uploaded here; drop it
+        stale_id = self.journal.stale_upload_id(bucket_name, key)
+        if stale_id:
+            try:
+                self.s3_client.abort_multipart_upload(Bucket=bucket_name, Key=key, UploadId=stale_id)
+            except Exception:
+                pass
+            self.journal.finish_upload(stale_id)
+
+        part_size = choose_part_size(file_size, self.part_size)
+        response = self.s3_client.create_multipart_upload(Bucket=bucket_name, Key=key)
+        upload_id = response['UploadId']
+        self.journal.start_upload(bucket_name, key, local_path, file_size, mtime_ns, part_size, upload_id)
+        return upload_id, part_size, {}
+
+    def _list_parts(self, bucket_name, key, upload_id):
+        parts = {}
+        paginator = self.s3_client.get_paginator('list_parts')
+        for page in paginator.paginate(Bucket=bucket_name, Key=key, UploadId=upload_id):
+            for part in page.get('Parts', []):
+                parts[part['PartNumber']] = part['ETag']
+        return parts
+
+    @staticmethod
+    def _part_length(part_number, part_size, file_size):
+        start = (part_number - 1) * part_size
+        return max(0, min(part_size, file_size - start))
+
+    def _upload_part(self, local_path, bucket_name, key, upload_id,
+                     part_number, part_size, file_size, callback):
+        length = self._part_length(part_number, part_size, file_size)
+        # The part is only read once the budget has room for it, and dropped right after sending
+        reserved = self.buffer.acquire(length)
+        try:
+            with open(local_path, 'rb') as file_obj:
+                file_obj.seek((part_number - 1) * part_size)
+                data = file_obj.read(length)
+
+            response = self.s3_client.upload_part(
+                Bucket=bucket_name,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=data
+            )
+            del data
+        finally:
+            self.buffer.release(reserved)
+        etag = response['ETag']
+        self.journal.record_part(upload_id, part_number, etag)
+        if callback:
+            callback(length)
+        return part_number, etag
@@ -0,0 +1,268 @@
+import os
+import queue
+import threading
+from collections import namedtuple
+
+from utils.file_hash import etag_matches
+from utils.transfer_pool import TransferJob
+
+# One side of a sync pair: key relative to the prefix / local root
+LocalEntry = namedtuple('LocalEntry', ['key', 'size', 'mtime', 'path'])
+RemoteEntry = namedtuple('RemoteEntry', ['key', 'size', 'mtime', 'etag'])
+
+SYNC_PUSH = 'push'   # local -> S3
+SYNC_PULL = 'pull'   # S3 -> local
+SYNC_BOTH = 'both'   # newest copy wins
+
+DELETE_BATCH_SIZE = 1000
+_END = object()
+
+
+def iter_local_sorted(local_root):
+    """Yield LocalEntry for every file under local_root in S3 key order.
+
+    Each directory is listed and sorted on its own, with sub-directories
+    ordered as ``name/`` so the combined stream matches the order in which
+    list_objects_v2 returns keys. Only one listing per depth level is held.
+    """
+    def walk(directory, relative):
+        try:
+            with os.scandir(directory) as entries:
+                items = []
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            items.append((entry.name + '/', entry.path, None))
+                        elif entry.is_file():
+                            items.append((entry.name, entry.path, entry.stat()))
+                    except OSError:
+                        continue
+        except OSError:
+            return
+        items.sort(key=lambda item: item[0])
+        for name, path, stat in items:
+            if stat is None:
+                yield from walk(path, relative + name)
+            else:
+                yield LocalEntry(relative + name, stat.st_size, stat.st_mtime, path)
+
+    yield from walk(local_root, '')
+
+
+def iter_remote_sorted(s3_client, bucket_name, prefix=''):
+    """Yield RemoteEntry for every object under prefix (already in key order)"""
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            key = obj['Key'][len(prefix):]
+            if not key or key.endswith('/'):
+                continue  # Folder markers carry no data
+            yield RemoteEntry(key, obj['Size'], obj['LastModified'].timestamp(), obj.get('ETag', ''))
+
+
+def _prefetch(iterable, maxsize=1000):
+    """Run ``iterable`` on its own thread, buffering at most ``maxsize`` items.
+
+    Closing the returned generator (e.g. when a sync is cancelled) stops the
+    producer and closes ``iterable`` on its thread.
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        # A full buffer is only waited on while someone is still consuming it
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        items = iter(iterable)
+        try:
+            for item in items:
+                if not put(item):
+                    return
+            put(_END)
+        except Exception as e:
+            put(e)
+        finally:
+            close = getattr(items, 'close', None)
+            if close:
+                close()
+
+    producer = threading.Thread(target=produce)
+    producer.daemon = True
+    producer.start()
+
+    try:
+        while True:
+            item = buffer.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+class SyncEngine:
+    """Incremental sync between a local folder and an S3 prefix.
+
+    The local scan and the bucket listing run concurrently and are merged as
+    two sorted streams, so memory stays flat however many objects there are.
+    Files are compared by size, then by modification time, and by ETag where
+    modification times cannot decide (two-way sync, or ``compare_etag``).
+    ``compare_etag`` defaults to on when a ``hash_cache`` is given, so a
+    one-way sync also catches changes that keep a file's size.
+    """
+
+    def __init__(self, s3_client, bucket_name, prefix, local_root,
+                 direction=SYNC_PUSH, delete=False, compare_etag=None, hash_cache=None,
+                 on_remote_delete=None, on_local_error=None):
+        if delete and direction == SYNC_BOTH:
+            raise ValueError("Deleting extraneous files needs a one-way sync")
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.local_root = os.path.abspath(local_root)
+        self.direction = direction
+        self.delete = delete
+        # Hashing is cheap to repeat with a cache, which only rehashes files that changed
+        self.compare_etag = hash_cache is not None if compare_etag is None else compare_etag
+        self.hash_cache = hash_cache
+        # Called with (bucket, [{'Key', 'Size'}, ...]) after each batch of remote deletes
+        self.on_remote_delete = on_remote_delete
+        # Called with (key, message) when a local file cannot be deleted; the sync carries on
+        self.on_local_error = on_local_error
+        self.stats = {'upload': 0, 'download': 0, 'delete_remote': 0, 'delete_local': 0, 'unchanged': 0}
+
+    def iter_diff(self):
+        """Yield (action, local_entry, remote_entry) for every difference"""
+        local_entries = _prefetch(iter_local_sorted(self.local_root))
+        remote_entries = _prefetch(iter_remote_sorted(self.s3_client, self.bucket_name, self.prefix))
+        try:
+            yield from self._merge(local_entries, remote_entries)
+        finally:
+            # Stop both producers if the consumer gave up early (e.g. a cancelled sync)
+            local_entries.close()
+            remote_entries.close()
+
+    def _merge(self, local_entries, remote_entries):
+        local = next(local_entries, None)
+        remote = next(remote_entries, None)
+        while local is not None or remote is not None:
+            if remote is None or (local is not None and local.key < remote.key):
+                action = self._local_only(local)
+                if action:
+                    yield action, local, None
+                local = next(local_entries, None)
+            elif local is None or remote.key < local.key:
+                action = self._remote_only(remote)
+                if action:
+                    yield action, None, remote
+                remote = next(remote_entries, None)
+            else:
+                action = self._compare(local, remote)
+                if action:
+                    yield action, local, remote
+                else:
+                    self.stats['unchanged'] += 1
+                local = next(local_entries, None)
+                remote = next(remote_entries, None)
+
+    def _local_only(self, local):
+        if self.direction in (SYNC_PUSH, SYNC_BOTH):
+            return 'upload'
+        return 'delete_local' if self.delete else None
+
+    def _remote_only(self, remote):
+        if self.direction in (SYNC_PULL, SYNC_BOTH):
+            return 'download'
+        return 'delete_remote' if self.delete else None
+
+    def _compare(self, local, remote):
+        if local.size != remote.size:
+            if self.direction == SYNC_BOTH:
+                return 'upload' if local.mtime > remote.mtime else 'download'
+            return 'upload' if self.direction == SYNC_PUSH else 'download'
+
+        if self.compare_etag or self.direction == SYNC_BOTH:
+            if etag_matches(local.path, local.size, remote.etag, cache=self.hash_cache):
+                return None
+            if self.direction == SYNC_BOTH:
+                return 'upload' if local.mtime > remote.mtime else 'download'
+            return 'upload' if self.direction == SYNC_PUSH else 'download'
+
+        # Uploads stamp LastModified with the upload time, downloads copy it locally
+        if self.direction == SYNC_PUSH and local.mtime > remote.mtime:
+            return 'upload'
+        if self.direction == SYNC_PULL and remote.mtime > local.mtime:
+            return 'download'
+        return None
+
+    def _local_path(self, path):
+        """Absolute form of path, or None if it is outside local_root (e.g. keys containing '..')"""
+        path = os.path.abspath(path)
+        if os.path.commonpath([self.local_root, path]) != self.local_root:
+            return None
+        return path
+
+    def iter_jobs(self):
+        """Turn the diff into TransferJobs; deletions are batched as they stream by"""
+        remote_deletes = []
+        for action, local, remote in self.iter_diff():
+            self.stats[action] += 1
+            if action == 'upload':
+                yield TransferJob(
+                    name=local.key,
+                    size=local.size,
+                    source=local.path,
+                    target=f"{self.prefix}{local.key}",
+                    action='upload'
+                )
+            elif action == 'download':
+                target = self._local_path(os.path.join(self.local_root, *remote.key.split('/')))
+                # Never write outside the chosen folder
+                if target is None:
+                    continue
+                yield TransferJob(
+                    name=remote.key,
+                    size=remote.size,
+                    source=f"{self.prefix}{remote.key}",
+                    target=target,
+                    action='download',
+                    mtime=remote.mtime
+                )
+            elif action == 'delete_local':
+                path = self._local_path(local.path)
+                if path is None:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    self.stats['delete_local'] -= 1
+                    if self.on_local_error:
+                        self.on_local_error(local.key, f"Failed to delete local file: {str(e)}")
+            elif action == 'delete_remote':
+                remote_deletes.append({'Key': f"{self.prefix}{remote.key}", 'Size': remote.size})
+                if len(remote_deletes) >= DELETE_BATCH_SIZE:
+                    self._delete_remote(remote_deletes)
+                    remote_deletes = []
+        if remote_deletes:
+            self._delete_remote(remote_deletes)
+
+    def _delete_remote(self, objects):
+        response = self.s3_client.delete_objects(
+            Bucket=self.bucket_name,
+            Delete={'Objects': [{'Key': obj['Key']} for obj in objects], 'Quiet': True}
+        )
+        errors = response.get('Errors', [])
+        if self.on_remote_delete:
+            failed = {error.get('Key') for error in errors}
+            self.on_remote_delete(self.bucket_name, [obj for obj in objects if obj['Key'] not in failed])
+        if errors:
+            raise Exception(f"Failed to delete {len(errors)} object(s), first: {errors[0].get('Key')}")
@@ -0,0 +1,70 @@
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+
+class TransferProfile:
+    """Multipart settings used for a class of transfers"""
+
+    def __init__(self, name, multipart_threshold, multipart_chunksize, max_concurrency):
+        self.name = name
+        self.multipart_threshold = multipart_threshold
+        self.multipart_chunksize = multipart_chunksize
+        self.max_concurrency = max_concurrency
+
+    def transfer_config(self):
+        return TransferConfig(
+            multipart_threshold=self.multipart_threshold,
+            multipart_chunksize=self.multipart_chunksize,
+            max_concurrency=self.max_concurrency,
+            use_threads=True
+        )
+
+    def __repr__(self):
+        return f"TransferProfile({self.name!r})"
+
+
+TRANSFER_PROFILES = {
+    # Many small files: the upload pool supplies the parallelism
+    'small_files': TransferProfile('small_files', 64 * MB, 8 * MB, 4),
+    # boto3's defaults
+    'standard': TransferProfile('standard', 8 * MB, 8 * MB, 10),
+    # Multi-GB files: big parts, many in flight to saturate the uplink
+    'large_files': TransferProfile('large_files', 64 * MB, 64 * MB, 16),
+}
+
+# 'auto' picks a profile from the size of each file
+AUTO_PROFILE = 'auto'
+SMALL_FILE_SIZE = 64 * MB
+LARGE_FILE_SIZE = 1 * GB
+
+
+def get_transfer_profile(name=None, file_size=None):
+    """Resolve a profile name (or 'auto' + file size) to a TransferProfile"""
+    if name and name != AUTO_PROFILE:
+        if name not in TRANSFER_PROFILES:
+            raise ValueError(f"Unknown transfer profile: {name}")
+        return TRANSFER_PROFILES[name]
+    if file_size is None:
+        return TRANSFER_PROFILES['standard']
+    if file_size < SMALL_FILE_SIZE:
+        return TRANSFER_PROFILES['small_files']
+    if file_size >= LARGE_FILE_SIZE:
+        return TRANSFER_PROFILES['large_files']
+    return TRANSFER_PROFILES['standard']
+
+
+def max_pool_connections(name=None, pool_workers=1):
+    """Connections needed for ``pool_workers`` files transferring at once"""
+    if name and name != AUTO_PROFILE:
+        concurrency = get_transfer_profile(name).max_concurrency
+    else:
+        concurrency = max(profile.max_concurrency for profile in TRANSFER_PROFILES.values())
+    return concurrency * pool_workers
+
+
+def client_config(name=None, pool_workers=1):
+    """botocore Config whose connection pool is sized for the profile"""
+    return Config(max_pool_connections=max_pool_connections(name, pool_workers))
@@ -0,0 +1,256 @@
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# A single file transfer: display name, size in bytes, source and target paths.
+# ``action`` ('upload'/'download') is set by producers that mix both kinds and
+# ``mtime`` is the modification time to give a downloaded file.
+TransferJob = namedtuple(
+    'TransferJob',
+    ['name', 'size', 'source', 'target', 'action', 'mtime'],
+    defaults=(None, None)
+)
+
+
+# Returned by a transfer function that found nothing to transfer
+SKIPPED = 'skipped'
+
+
+class TransferCancelled(Exception):
+    """Raised from a progress callback when the pool has been cancelled"""
+
+
+class TransferPool:
+    """Bounded pool of worker threads that drains a stream of transfer jobs.
+
+    Progress is never reported to Tkinter directly. Instead the pool posts
+    messages to ``update_queue`` which the interfaces drain in ``process_queue``.
+    ``kind`` ('upload' or 'download') tells the receiver which pool sent them:
+
+    - ``('progress', percent)``            aggregate progress of the batch
+    - ``('throughput', (kind, bytes_per_sec, eta_seconds))``
+    - ``('file_progress', (kind, name, percent))``
+    - ``('file_success', (kind, name))``
+    - ``('file_skipped', (kind, name))``        the transfer function returned SKIPPED
+    - ``('file_error', (kind, name, message))``
+    - ``('queue_done', (kind, succeeded, failed, cancelled, skipped))``
+    """
+
+    PROGRESS_INTERVAL = 0.1  # seconds between progress messages
+
+    def __init__(self, update_queue, max_workers=8, backlog=None, kind='upload'):
+        self.update_queue = update_queue
+        self.kind = kind
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='transfer'
+        )
+        # Limits how far a feeder may run ahead of the workers
+        self._slots = threading.BoundedSemaphore(backlog or max_workers * 4)
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._feeders = 0
+        self._pending = 0
+        self._finished = True
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.total_bytes = 0
+        self.transferred_bytes = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.skipped = 0
+        self._last_post = 0
+        self._started = time.monotonic()
+
+    @property
+    def is_busy(self):
+        with self._lock:
+            return self._feeders > 0 or self._pending > 0
+
+    @property
+    def is_cancelled(self):
+        return self._cancel.is_set()
+
+    def submit_many(self, jobs, transfer_fn):
+        """Queue an iterable of TransferJob for ``transfer_fn(job, callback)``.
+
+        ``jobs`` may be a lazy generator; it is consumed on a feeder thread so
+        the caller (usually the Tk main thread) never blocks.
+        """
+        with self._lock:
+            if self._feeders == 0 and self._pending == 0:
+                self._cancel.clear()
+                self._reset_counters()
+            self._finished = False
+            self._feeders += 1
+
+        feeder = threading.Thread(target=self._feed, args=(jobs, transfer_fn))
+        feeder.daemon = True
+        feeder.start()
+        return feeder
+
+    def cancel(self):
+        """Stop queued jobs and abort running transfers at their next callback"""
+        self._cancel.set()
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
+
+    def _feed(self, jobs, transfer_fn):
+        try:
+            for job in jobs:
+                if self._cancel.is_set():
+                    break
+                self._slots.acquire()
+                with self._lock:
+                    self._pending += 1
+                    self.total_bytes += job.size
+                self._executor.submit(self._run_job, job, transfer_fn)
+        except Exception as e:
+            self.update_queue.put(('error', f"Failed to queue transfers: {str(e)}"))
+        finally:
+            # A cancelled batch leaves a generator part way; closing it lets its producers stop
+            close = getattr(jobs, 'close', None)
+            if close:
+                close()
+            with self._lock:
+                self._feeders -= 1
+            self._maybe_finish()
+
+    def _run_job(self, job, transfer_fn):
+        done = 0
+
+        def progress_callback(bytes_amount):
+            nonlocal done
+            if self._cancel.is_set():
+                raise TransferCancelled(f"Transfer of {job.name} canceled by user.")
+            # Ranged and resumable transfers call this from several threads at once
+            with self._lock:
+                done += bytes_amount
+                job_done = done
+                self.transferred_bytes += bytes_amount
+            self._post_progress(job, job_done)
+
+        try:
+            if self._cancel.is_set():
+                raise TransferCancelled(f"Transfer of {job.name} canceled by user.")
+            result = transfer_fn(job, progress_callback)
+            with self._lock:
+                if result == SKIPPED:
+                    self.skipped += 1
+                else:
+                    self.succeeded += 1
+                # Jobs may finish without reporting every byte (e.g. skipped)
+                self.transferred_bytes += max(0, job.size - done)
+            message = 'file_skipped' if result == SKIPPED else 'file_success'
+            self.update_queue.put((message, (self.kind, job.name)))
+        except Exception as e:
+            # Helpers wrap callback errors, so a cancel may surface as any Exception
+            if not isinstance(e, TransferCancelled) and not self._cancel.is_set():
+                with self._lock:
+                    self.failed += 1
+                    self.total_bytes -= job.size
+                    self.transferred_bytes -= done
+                self.update_queue.put(('file_error', (self.kind, job.name, str(e))))
+                return
+            with self._lock:
+                self.cancelled += 1
+                self.total_bytes -= job.size
+                self.transferred_bytes -= done
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self._slots.release()
+            self._maybe_finish()
+
+    def _post_progress(self, job, done):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_post < self.PROGRESS_INTERVAL:
+                return
+            self._last_post = now
+            total = self.total_bytes
+            transferred = self.transferred_bytes
+            elapsed = now - self._started
+        if job.size:
+            self.update_queue.put(('file_progress', (self.kind, job.name, min(100.0, done / job.size * 100))))
+        if total:
+            self.update_queue.put(('progress', min(100.0, transferred / total * 100)))
+        if elapsed > 0 and transferred > 0:
+            rate = transferred / elapsed
+            eta = max(0, total - transferred) / rate
+            self.update_queue.put(('throughput', (self.kind, rate, eta)))
+
+    def _maybe_finish(self):
+        with self._lock:
+            if self._feeders or self._pending or self._finished:
+                return
+            self._finished = True
+            summary = (self.kind, self.succeeded, self.failed, self.cancelled, self.skipped)
+        self.update_queue.put(('progress', 100.0 if summary[1] or summary[4] else 0.0))
+        self.update_queue.put(('queue_done', summary))
+
+
+def iter_folder_jobs(local_root, prefix=''):
+    """Lazily walk ``local_root`` and yield an upload TransferJob per file.
+
+    Keys are the file's path relative to ``local_root`` under ``prefix``.
+    Directories are scanned one at a time so the first jobs are produced
+    before the walk of a large tree has finished.
+    """
+    stack = [local_root]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = os.scandir(current)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file():
+                        relative = os.path.relpath(entry.path, local_root).replace(os.sep, '/')
+                        yield TransferJob(
+                            name=relative,
+                            size=entry.stat().st_size,
+                            source=entry.path,
+                            target=f"{prefix}{relative}"
+                        )
+                except OSError:
+                    continue
+
+
+def iter_upload_jobs(paths, prefix=''):
+    """Yield upload jobs for a mix of files and folders under ``prefix``"""
+    for path in paths:
+        if os.path.isdir(path):
+            folder_name = os.path.basename(os.path.normpath(path))
+            yield from iter_folder_jobs(path, f"{prefix}{folder_name}/")
+        else:
+            file_name = os.path.basename(path)
+            yield TransferJob(
+                name=file_name,
+                size=os.path.getsize(path),
+                source=path,
+                target=f"{prefix}{file_name}"
+            )
+
+
+def format_duration(seconds):
+    """Format an ETA such as 95 seconds as '1m 35s'"""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m"
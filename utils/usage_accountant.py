@@ -0,0 +1,119 @@
+import threading
+
+from utils.listing_cache import parent_prefixes
+
+
+class UsageAccountant:
+    """Running storage totals per bucket and per folder prefix.
+
+    Each bucket is seeded once from a full listing (or a local bucket index);
+    after that the uploads, copies and deletes made through this app adjust
+    the totals, so quota checks read a number instead of scanning the bucket.
+    Changes to a bucket are only tracked once its seed has started.
+
+    A change made while the seed listing runs is kept per key. The listing
+    is in key order, so a key it had already passed was seen as it was
+    before the change, and the change is added on top. For a key still
+    ahead, the size the listing reports shows which state it saw, and the
+    change is dropped if the listing already counted it.
+    """
+
+    def __init__(self):
+        self._totals = {}    # bucket -> {prefix: bytes}, '' being the whole bucket
+        self._ready = {}     # bucket -> Event set once the seed has finished
+        self._changes = {}   # bucket -> {key: change made during the seed}
+        self._position = {}  # bucket -> last key the seed listing has passed
+        self._lock = threading.Lock()
+
+    def begin_seed(self, bucket_name):
+        """True for the first caller only, who must then call seed()"""
+        with self._lock:
+            if bucket_name in self._ready:
+                return False
+            self._ready[bucket_name] = threading.Event()
+            self._totals[bucket_name] = {}
+            self._changes[bucket_name] = {}
+            self._position[bucket_name] = ''
+            return True
+
+    def seed(self, bucket_name, objects):
+        """Total up ``objects`` (listing dicts with Key and Size) as the bucket's usage"""
+        totals = {}
+        try:
+            for obj in objects:
+                key, size = obj['Key'], obj.get('Size', 0)
+                for prefix in parent_prefixes(key):
+                    totals[prefix] = totals.get(prefix, 0) + size
+                with self._lock:
+                    self._position[bucket_name] = key
+                    change = self._changes[bucket_name].get(key)
+                    if change is not None and not change['passed']:
+                        change['reported'] = size
+        except Exception:
+            # Let a later selection of the bucket try again
+            with self._lock:
+                self._totals.pop(bucket_name, None)
+                self._changes.pop(bucket_name, None)
+                self._position.pop(bucket_name, None)
+                self._ready.pop(bucket_name).set()
+            raise
+
+        with self._lock:
+            for key, change in self._changes.pop(bucket_name).items():
+                # The listing reached this key after the change and saw its new state
+                if not change['passed'] and change.get('reported') == change['size']:
+                    continue
+                for prefix in parent_prefixes(key):
+                    totals[prefix] = totals.get(prefix, 0) + change['delta']
+            self._position.pop(bucket_name)
+            self._totals[bucket_name] = totals
+            self._ready[bucket_name].set()
+
+    def is_tracking(self, bucket_name):
+        with self._lock:
+            return bucket_name in self._ready
+
+    def is_seeded(self, bucket_name):
+        with self._lock:
+            ready = self._ready.get(bucket_name)
+            return ready is not None and ready.is_set()
+
+    def wait(self, bucket_name, timeout=None):
+        """Block until the bucket's seed finishes; False if it is not (or no longer) seeding"""
+        with self._lock:
+            ready = self._ready.get(bucket_name)
+        if ready is None:
+            return False
+        ready.wait(timeout)
+        return self.is_seeded(bucket_name)
+
+    def usage(self, bucket_name, prefix=''):
+        """Bytes stored under prefix ('' for the whole bucket)"""
+        with self._lock:
+            return self._totals.get(bucket_name, {}).get(prefix, 0)
+
+    def adjust(self, bucket_name, key, delta, size=None):
+        """Add ``delta`` bytes for key to its bucket and every folder above it
+
+        ``size`` is what key holds after the change (None once it is deleted);
+        an overwrite passes the difference from the replaced object as delta.
+        """
+        if not delta:
+            return
+        with self._lock:
+            if bucket_name not in self._ready:
+                return  # The seed listing will see this change
+            changes = self._changes.get(bucket_name)
+            if changes is not None:
+                # Seeding: settled against what the listing reports once it finishes
+                change = changes.setdefault(key, {'delta': 0, 'passed': key <= self._position[bucket_name]})
+                change['delta'] += delta
+                change['size'] = size
+                return
+            totals = self._totals[bucket_name]
+            for prefix in parent_prefixes(key):
+                total = totals.get(prefix, 0) + delta
+                if total:
+                    totals[prefix] = total
+                else:
+                    totals.pop(prefix, None)
@@ -0,0 +1,275 @@
+import heapq
+import sys
+import time
+from bisect import bisect_left
+from collections import deque
+
+# Fallback row height (pixels) when the Treeview style does not set one
+ROW_HEIGHT = 20
+# Rows materialised past each edge of the viewport
+DEFAULT_MARGIN = 50
+# Time one slice of row loading may take before yielding to the event loop
+SLICE_SECONDS = 0.008
+# Rows added to the model between deadline checks
+CHUNK_ROWS = 250
+
+
+class VirtualTreeview:
+    """Flat row model behind a ``ttk.Treeview`` that only holds the visible rows.
+
+    The rows of the folder are kept as plain ``(iid, text, values)`` tuples,
+    sorted by iid (folders' ``d:`` ids before files' ``f:`` ids). Only those in the viewport plus ``margin`` rows either side become Tk
+    items, using the row's iid so selection, drag and drop and double click
+    handlers keep working on ``tree.item(iid)``. The scrollbar is driven
+    from the model, so it reflects the whole folder, and the window of
+    materialised rows moves as the user scrolls.
+    """
+
+    def __init__(self, tree, scrollbar, margin=DEFAULT_MARGIN):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.margin = margin
+        self.rows = []       # (iid, text, values) in iid order
+        self.positions = {}  # iid -> index into rows
+        self.first = 0       # index of the first materialised row
+        self.window = []     # iids of the materialised rows
+        self.placeholder = None
+
+        tree.configure(yscrollcommand=self.on_tree_scroll)
+        scrollbar.configure(command=self.yview)
+        tree.bind('<Configure>', lambda event: self.render(self.top_row()), add='+')
+        if sys.platform.startswith('linux'):
+            tree.bind('<Button-4>', lambda event: self.yview_scroll(-3, 'units'), add='+')
+            tree.bind('<Button-5>', lambda event: self.yview_scroll(3, 'units'), add='+')
+        else:
+            tree.bind('<MouseWheel>', self.on_mouse_wheel, add='+')
+
+    def __len__(self):
+        return len(self.rows)
+
+    def exists(self, iid):
+        return iid in self.positions
+
+    def ids(self):
+        return [row[0] for row in self.rows]
+
+    def clear(self):
+        self.rows = []
+        self.positions = {}
+        self.placeholder = None
+        self.render(0)
+
+    def upsert(self, rows):
+        """Add new (iid, text, values) rows in iid order and update the ones already present"""
+        top = self.top_row()
+        # Rows added past the materialised window only move the scrollbar
+        window_end = top + self.visible_rows() + self.margin
+        changed = False
+        added = {}
+        for row in rows:
+            position = self.positions.get(row[0])
+            if position is None:
+                added[row[0]] = row
+            elif self.rows[position] != row:
+                self.rows[position] = row
+                if self.first <= position < self.first + len(self.window):
+                    self.tree.item(row[0], text=row[1], values=row[2])
+
+        if added:
+            added = sorted(added.values())
+            # A listing streams in key order, so new rows usually just go on the end
+            start = bisect_left(self.rows, (added[0][0],))
+            if top < len(self.rows):
+                # Keep the same rows in view when some land above them
+                top += bisect_left(added, (self.rows[top][0],))
+            self.rows[start:] = heapq.merge(self.rows[start:], added)
+            for index in range(start, len(self.rows)):
+                self.positions[self.rows[index][0]] = index
+            changed = start < window_end
+        if self.placeholder is not None:
+            self.placeholder = None
+            changed = True
+        if changed:
+            self.render(top)
+        else:
+            self.update_scrollbar()
+
+    def retain(self, iids):
+        """Drop every row whose iid is not in ``iids``"""
+        kept = [row for row in self.rows if row[0] in iids]
+        if len(kept) != len(self.rows):
+            # Stay on the same rows rather than the same position
+            top = sum(1 for row in self.rows[:self.top_row()] if row[0] in iids)
+            self.rows = kept
+            self.positions = {row[0]: index for index, row in enumerate(kept)}
+            self.render(top)
+
+    def set_placeholder(self, text):
+        """Show a single text-only row (e.g. 'Empty folder') while there are no rows"""
+        self.placeholder = text
+        self.render(0)
+
+    def visible_rows(self):
+        height = self.tree.winfo_height()
+        return max(int(self.tree.cget('height')), height // ROW_HEIGHT if height > 1 else 0, 1)
+
+    def top_row(self):
+        if not self.window:
+            return self.first
+        return self.first + int(round(self.tree.yview()[0] * len(self.window)))
+
+    def render(self, top):
+        """Materialise the rows around ``top`` and scroll the tree so that row is first"""
+        visible = self.visible_rows()
+        total = len(self.rows)
+        top = max(0, min(top, total - visible))
+        first = max(0, top - self.margin)
+        window = self.rows[first:top + visible + self.margin]
+        window_ids = [row[0] for row in window]
+
+        if first == self.first and self.window and window_ids[:len(self.window)] == self.window:
+            # The window only grew at the end (rows streaming in): add just those
+            for iid, text, values in window[len(self.window):]:
+                self.tree.insert("", "end", iid, text=text, values=values)
+        else:
+            selection = self.tree.selection()
+            children = self.tree.get_children()
+            if children:
+                self.tree.delete(*children)
+            for iid, text, values in window:
+                self.tree.insert("", "end", iid, text=text, values=values)
+            if not window and self.placeholder:
+                self.tree.insert("", "end", text=self.placeholder)
+            kept = [iid for iid in selection if self.tree.exists(iid)]
+            if kept:
+                self.tree.selection_set(kept)
+        self.first = first
+        self.window = window_ids
+
+        if window:
+            self.tree.yview_moveto((top - first) / len(window))
+        self.update_scrollbar()
+
+    def scroll_to(self, top):
+        visible = self.visible_rows()
+        top = max(0, min(top, len(self.rows) - visible))
+        if self.first <= top and top + visible <= self.first + len(self.window) or not self.rows:
+            self.tree.yview_moveto((top - self.first) / len(self.window) if self.window else 0)
+        else:
+            self.render(top)
+
+    def yview(self, *args):
+        """Scrollbar command: 'moveto' fraction or 'scroll' n units/pages over the whole model"""
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * len(self.rows)))
+        elif args[0] == 'scroll':
+            self.yview_scroll(int(args[1]), args[2])
+
+    def yview_scroll(self, number, what):
+        step = self.visible_rows() if what == 'pages' else 1
+        self.scroll_to(self.top_row() + number * step)
+        return 'break'
+
+    def on_mouse_wheel(self, event):
+        # Windows reports multiples of 120, macOS small deltas
+        units = -event.delta // 120 if abs(event.delta) >= 120 else -event.delta
+        return self.yview_scroll(units * 3, 'units')
+
+    def on_tree_scroll(self, low, high):
+        self.update_scrollbar(float(low), float(high))
+        # Keyboard navigation scrolls the tree itself; move the window before it runs out
+        top = self.top_row()
+        end = self.first + len(self.window)
+        if (top <= self.first and self.first > 0) or (top + self.visible_rows() >= end and end < len(self.rows)):
+            self.tree.after_idle(lambda: self.render(self.top_row()))
+
+    def update_scrollbar(self, low=None, high=None):
+        total = len(self.rows)
+        if not total or not self.window:
+            self.scrollbar.set(0, 1)
+            return
+        if low is None:
+            low, high = self.tree.yview()
+        top = self.first + low * len(self.window)
+        bottom = self.first + high * len(self.window)
+        self.scrollbar.set(top / total, bottom / total)
+
+
+class ProgressiveLoader:
+    """Adds rows to a VirtualTreeview in time-boxed slices scheduled with ``after``.
+
+    Each slice adds chunks of rows until its time budget is spent and then
+    yields to the event loop, so the first screenful shows up at once and
+    scrolling stays responsive while the rest streams in. ``loaded`` and
+    ``known`` count the distinct rows added so far and received so far (a
+    row drawn from the index and then again from S3 counts once).
+    """
+
+    def __init__(self, view, on_progress=None, slice_seconds=SLICE_SECONDS, chunk_rows=CHUNK_ROWS):
+        self.view = view
+        self.on_progress = on_progress
+        self.slice_seconds = slice_seconds
+        self.chunk_rows = chunk_rows
+        self.pending = deque()  # [rows, offset of the first row not added yet]
+        self.waiting = []       # callbacks for when every pending row is in
+        self.scheduled = None
+        self.known_ids = set()
+        self.loaded_ids = set()
+
+    @property
+    def loaded(self):
+        return len(self.loaded_ids)
+
+    @property
+    def known(self):
+        return len(self.known_ids)
+
+    def reset(self):
+        """Drop rows not added yet (a new listing is starting)"""
+        if self.scheduled is not None:
+            self.view.tree.after_cancel(self.scheduled)
+            self.scheduled = None
+        self.pending.clear()
+        self.waiting = []
+        self.known_ids = set()
+        self.loaded_ids = set()
+
+    def add(self, rows):
+        if not rows:
+            return
+        self.pending.append([rows, 0])
+        self.known_ids.update(row[0] for row in rows)
+        self.schedule()
+
+    def when_loaded(self, callback):
+        """Run callback once every row added so far is in the view"""
+        if self.pending:
+            self.waiting.append(callback)
+        else:
+            callback()
+
+    def schedule(self):
+        if self.scheduled is None:
+            self.scheduled = self.view.tree.after(1, self.run_slice)
+
+    def run_slice(self):
+        self.scheduled = None
+        deadline = time.perf_counter() + self.slice_seconds
+        while self.pending and time.perf_counter() < deadline:
+            entry = self.pending[0]
+            rows, offset = entry
+            chunk = rows[offset:offset + self.chunk_rows]
+            entry[1] = offset + len(chunk)
+            if entry[1] >= len(rows):
+                self.pending.popleft()
+            self.view.upsert(chunk)
+            self.loaded_ids.update(row[0] for row in chunk)
+
+        if self.on_progress:
+            self.on_progress(self.loaded, self.known)
+        if self.pending:
+            self.schedule()
+        else:
+            waiting, self.waiting = self.waiting, []
+            for callback in waiting:
+                callback()